@@ -1,14 +1,16 @@
+import os
 import sys
 import math
 import glfw
-import pickle
+import numpy as np
 
 from PySide2 import QtCore, QtWidgets, QtOpenGL, QtGui
 from PySide2.QtCore import Qt, Slot
 from PySide2.QtGui import QPainter, QKeyEvent, QOpenGLShaderProgram
 from PySide2.QtWidgets import (QAction, QApplication, QHeaderView, QHBoxLayout, QLabel, QLineEdit,
                                QMainWindow, QPushButton, QTableWidget, QTableWidgetItem,
-                               QVBoxLayout, QWidget, QListWidget, QListWidgetItem, QOpenGLWidget)
+                               QVBoxLayout, QWidget, QListView, QOpenGLWidget, QFileDialog,
+                               QAbstractItemView, QComboBox)
 from PySide2.QtCharts import QtCharts
 from pyrr import Vector3, vector, vector3, matrix44
 from ObjLoader import ObjLoader
@@ -27,59 +29,25 @@ except ImportError:
     sys.exit(1)
 
 from OpenGL.GL.shaders import compileProgram, compileShader
-from glWidget import GLWidget
+from glWidget import GLWidget, meshRegistry, DIRTY_SCENE
+from scenePersistence import ScenePersistence
+from parallelImport import ObjImportPool
+from backgroundImport import BackgroundImporter
+from sceneStore import SceneStore, Geometry
+from sceneListModel import SceneListModel, SceneFilterModel, OBJECT_ROLE
 
-class Geometry:
-    def __init__(self, geometry):
-        self.name = f'new {geometry}'
-        self.geometry = geometry
-        self.position = [0.0, 0.0, 0.0]
-        self.color = [0, 0, 1]
-        self.scale = [1, 1, 1]
-        self.rotation = [0, 0, 0]
-        self.translation = [0, 0, 0]
 
-    def get_name(self):
-        return self.name
+# Processes parsing imported OBJ files, None for one per CPU
+IMPORT_WORKERS = None
 
-    def get_geometry(self):
-        return self.geometry
+# Bulk edit modes
+BULK_SET = 'Set'
+BULK_OFFSET = 'Offset'
+BULK_SCALE = 'Scale about pivot'
 
-    def get_color(self):
-        return self.color
 
-    def get_position(self):
-        return self.position
-
-    def get_scale(self):
-        return self.scale
-
-    def get_rotation(self):
-        return self.rotation
-
-    def get_translation(self):
-        return self.translation
-
-    def set_name(self,name):
-        self.name = name
-
-    def set_color(self,color):
-        self.color = color
-
-    def set_position(self,position):
-        self.position = position
-
-    def set_scale(self,scale):
-        self.scale = scale
-
-    def set_rotation(self,rotation):
-        self.rotation = rotation
-
-    def set_translation(self,translation):
-        self.translation = translation
-
-    def __repr__(self):
-        return f'{self.name} {self.color}'
+def format_vector(values):
+    return ', '.join(f'{v:g}' for v in values)
 
 
 class Widget(QWidget):
@@ -87,9 +55,13 @@ class Widget(QWidget):
         QWidget.__init__(self)
         self.items = 0
 
-        self.object_list = []
+        # Object attributes live in store columns, the list view reads them
+        # through objectModel, filtered by objectFilter
+        self.store = SceneStore()
+        self.objectModel = SceneListModel()
+        self.objectFilter = SceneFilterModel()
+        self.objectFilter.setSourceModel(self.objectModel)
         self.current_object = None
-        self.current_item = None
 
         # Left
         self.left = QVBoxLayout()
@@ -110,13 +82,29 @@ class Widget(QWidget):
         self.right = QVBoxLayout()
         self.right.setMargin(10)
 
-        self.listWidget = QListWidget()
-        self.right.addWidget(self.listWidget)
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Search")
+        self.listView = QListView()
+        # Rows are never measured one by one, so huge scenes lay out instantly
+        self.listView.setUniformItemSizes(True)
+        self.listView.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.listView.setModel(self.objectFilter)
+        self.right.addWidget(self.search)
+        self.right.addWidget(self.listView)
 
         self.addCube = QPushButton("Add Cube")
         self.addSphere = QPushButton("Add Sphere")
+        self.addTeapot = QPushButton("Add Teapot")
+        self.importMesh = QPushButton("Import OBJ...")
         self.right.addWidget(self.addCube)
         self.right.addWidget(self.addSphere)
+        self.right.addWidget(self.addTeapot)
+        self.right.addWidget(self.importMesh)
+        self.importStatus = QLabel()
+        self.cancelImport = QPushButton("Cancel Import")
+        self.cancelImport.hide()
+        self.right.addWidget(self.importStatus)
+        self.right.addWidget(self.cancelImport)
 
 
         self.name = QLineEdit()
@@ -142,6 +130,19 @@ class Widget(QWidget):
         self.right.addWidget(self.color)
         self.right.addWidget(self.delete)
 
+        # Bulk edits apply to every selected object at once
+        self.bulkColumn = QComboBox()
+        self.bulkColumn.addItems(['translation', 'rotation', 'scale', 'color'])
+        self.bulkMode = QComboBox()
+        self.bulkMode.addItems([BULK_SET, BULK_OFFSET, BULK_SCALE])
+        self.bulkValue = QLineEdit()
+        self.bulkApply = QPushButton("Apply to Selection")
+        self.right.addWidget(QLabel("selection (x, y, z)"))
+        self.right.addWidget(self.bulkColumn)
+        self.right.addWidget(self.bulkMode)
+        self.right.addWidget(self.bulkValue)
+        self.right.addWidget(self.bulkApply)
+
         # QWidget Layout
         self.layout = QHBoxLayout()
 
@@ -153,10 +154,16 @@ class Widget(QWidget):
         self.setLayout(self.layout)
 
         # Signals and Slots
-        self.listWidget.currentItemChanged.connect(self.item_clicked)
+        self.listView.selectionModel().currentChanged.connect(self.item_clicked)
+        self.search.textChanged[str].connect(self.objectFilter.set_search)
+        self.glWidget.object_picked.connect(self.select_picked)
         self.addCube.clicked.connect(self.add_cube)
         self.addSphere.clicked.connect(self.add_sphere)
+        self.addTeapot.clicked.connect(self.add_teapot)
+        self.importMesh.clicked.connect(self.import_mesh)
+        self.cancelImport.clicked.connect(self.cancel_import)
         self.delete.clicked.connect(self.delete_object)
+        self.bulkApply.clicked.connect(self.apply_bulk)
         self.name.textChanged[str].connect(self.change_name)
         self.position.textChanged[str].connect(self.change_position)
         self.scale.textChanged[str].connect(self.change_scale)
@@ -166,152 +173,241 @@ class Widget(QWidget):
         self.keyDownEvent = QKeyEvent(QKeyEvent.KeyPress, 10, Qt.NoModifier, '', False, 1)
         # self.keyUpEvent = QKeyEvent(QKeyEvent.KeyRelease, 10, Qt.NoModifier, '', False, 1)
 
+        # Edits are journaled and written in the background, see save_object
+        self.persistence = ScenePersistence('cache')
+        # Worker processes only start with the first import
+        self.importPool = ObjImportPool(IMPORT_WORKERS)
+        meshRegistry.importPool = self.importPool
+        # Imports run on a thread pool, objects show a placeholder box until their mesh is ready
+        self.importer = BackgroundImporter(meshRegistry, parent=self)
+        self.importer.progress.connect(self.import_progress)
+        self.importer.placeholder_changed.connect(self.glWidget.geometry_changed)
+        self.importer.loaded.connect(self.import_loaded)
+        self.importer.failed.connect(self.import_failed)
+        self.importer.cancelled.connect(self.import_cancelled)
+        self.importer.lods_changed.connect(self.glWidget.lods_changed)
         try:
-            f = open('cache','rb')
-            self.object_list = pickle.load(f)
-            print(self.object_list)
-            f.close()
-
-            for obj in self.object_list:
-                item = QListWidgetItem()
-                item.setText(obj.name)
-                self.listWidget.addItem(item)
-                item.setData(QtCore.Qt.UserRole, obj)
+            for state in self.persistence.load():
+                self.store.append_state(state)
+            print(f'{len(self.store)} objects loaded')
+
+            # Imported meshes use their file path as id
+            for geometry in self.store.geometry_ids_in_use():
+                if geometry not in meshRegistry and os.path.isfile(geometry):
+                    meshRegistry.register_file(geometry)
+                    self.importer.start(geometry)
         except:
             print("loading error")
-            
-        self.glWidget.setObjList(self.object_list)
-        self.glWidget.updateGL()
+
+        # Attached after loading, so the view sees one reset instead of a signal per object
+        self.objectModel.set_store(self.store)
+        self.glWidget.setObjList(self.store)
 
     def keyPressEvent(self, e):
-        print("pressed some key")
-        print(e.key())
-
-        # 'W'
-        if e.key() == 87:
-            print('W up?')
-            self.glWidget.camPosition[2] -= 0.1
-
-        # 'S'
-        elif e.key() == 83:
-            print('S up?')
-            self.glWidget.camPosition[2] += 0.1
-
-        # 'A'
-        elif e.key() == 65:
-            print('A up?')
-            self.glWidget.camPosition[0] += 0.1
-
-        # 'D'
-        elif e.key() == 68:
-            print('D up?')
-            self.glWidget.camPosition[0] -= 0.1
-
-        # 'Q'
-        elif e.key() == 81:
-            print('Q up?')
-            quat_rotateY(self.glWidget.camRotation, self.glWidget.camRotation, -0.1)
-        # 'E'
-        elif e.key() == 69:
-            print('E up?')
-            quat_rotateY(self.glWidget.camRotation, self.glWidget.camRotation, 0.1)
-
-        # 'R'
-        elif e.key() == 82:
-            print('R up?')
-            self.glWidget.camPosition[1] -= 0.1
-
-        # 'F'
-        elif e.key() == 70:
-            print('F up?')
-            self.glWidget.camPosition[1] += 0.1
-
-
-        self.glWidget.updateGL()
+        # F3 toggles the frame profiler overlay
+        if e.key() == QtCore.Qt.Key_F3:
+            self.glWidget.set_profiling(not self.glWidget.renderer.profiler.enabled)
+        # Movement keys are held until released, the camera moves on its own frame clock
+        elif not self.glWidget.camera.key_pressed(e.key()):
+            super().keyPressEvent(e)
+
+    def keyReleaseEvent(self, e):
+        # Some platforms send a release before every repeated press
+        if e.isAutoRepeat():
+            return
+        if not self.glWidget.camera.key_released(e.key()):
+            super().keyReleaseEvent(e)
+
+    def changeEvent(self, e):
+        # Releases are not delivered once the window is in the background
+        if e.type() == QtCore.QEvent.ActivationChange and not self.isActiveWindow():
+            self.glWidget.camera.release_all()
+        super().changeEvent(e)
+
+    def add_mesh(self, geometry):
+        obj = self.store.append(geometry)
+        self.glWidget.setObjList(self.store)
+        self.save_object(obj)
+
+        print(obj.name)
+
+
+    def save_object(self, obj):
+        self.persistence.put(obj.uid, obj.get_state())
+
 
     @Slot()
     def add_cube(self):
-        cube = Geometry('cube')
-        item = QListWidgetItem()
-        item.setText(cube.name)
-        self.listWidget.addItem(item)
-        item.setData(QtCore.Qt.UserRole, cube)
-
-        self.object_list.append(cube)
-        self.glWidget.setObjList(self.object_list)
-        f = open('cache','wb')
-        pickle.dump(self.object_list, f)
-        f.close()
-        # QListWidgetItem(cube.name, self.listWidget)
-        print(item.text())
+        self.add_mesh('cube')
 
 
     @Slot()
     def add_sphere(self):
-        sphere = Geometry('sphere')
-        item = QListWidgetItem()
-        item.setText(sphere.name)
-        self.listWidget.addItem(item)
-        item.setData(QtCore.Qt.UserRole, sphere)
+        self.add_mesh('sphere')
 
-        self.object_list.append(sphere)
-        self.glWidget.setObjList(self.object_list)
 
-        f = open('cache','wb')
-        pickle.dump(self.object_list, f)
-        f.close()
-        
-        # QListWidgetItem(sphere.name, self.listWidget)
-        print(item.text())
+    @Slot()
+    def add_teapot(self):
+        self.add_mesh('teapot')
+
+
+    @Slot()
+    def import_mesh(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, "Import OBJ", "", "Wavefront OBJ (*.obj)")
+        if not paths:
+            return
+        for path in paths:
+            name = meshRegistry.register_file(os.path.abspath(path))
+            # Placed right away, drawn as a placeholder until the import finishes
+            self.importer.start(name)
+            self.add_mesh(name)
+
+
+    @Slot()
+    def cancel_import(self):
+        self.importer.cancel()
+
+
+    @Slot(str, float)
+    def import_progress(self, name, fraction):
+        self.importStatus.setText(f'Importing {os.path.basename(name)}: {100 * fraction:.0f}%')
+        self.cancelImport.show()
+
+
+    @Slot(str)
+    def import_loaded(self, name):
+        self.glWidget.geometry_changed(name)
+        self.import_done(f'Imported {os.path.basename(name)}')
+
+
+    @Slot(str, str)
+    def import_failed(self, name, message):
+        print(f"Import of {name} failed:", message)
+        self.remove_geometry(name)
+        self.import_done(f'Import of {os.path.basename(name)} failed')
+
+
+    @Slot(str)
+    def import_cancelled(self, name):
+        self.remove_geometry(name)
+        self.import_done(f'Import of {os.path.basename(name)} cancelled')
+
+
+    def import_done(self, status):
+        self.importStatus.setText(status)
+        if not self.importer.running():
+            self.cancelImport.hide()
+
+
+    def remove_geometry(self, geometry):
+        """Delete every object using `geometry`, after its import failed or was cancelled."""
+        store = self.store
+        if geometry in store.geometryIds:
+            code = store.geometryIds.index(geometry)
+            # Highest rows first, so the rows moved into the holes have been checked
+            for row in np.flatnonzero(store.columns('geometry') == code)[::-1]:
+                self.persistence.delete(store.uids[row])
+                store.remove(int(row))
+        self.glWidget.geometry_changed(geometry)
+        self.glWidget.setObjList(self.store)
 
 
     @Slot()
     def delete_object(self):
         try:
-            row = self.listWidget.row(self.current_item)
-            del self.object_list[row]
-            self.glWidget.setObjList(self.object_list)
-            f = open('cache','wb')
-            pickle.dump(self.object_list, f)
-            f.close()
-            self.listWidget.takeItem(row)
+            obj = self.current_object
+            self.persistence.delete(obj.uid)
+            self.store.remove(obj.row)
+            self.glWidget.setObjList(self.store)
         except:
             print("Delete error.")
 
 
     @Slot()
-    def item_clicked(self, arg=None):
+    def item_clicked(self, current=None, previous=None):
         try:
-            print(self.listWidget.currentItem().text())
-            obj = arg.data(QtCore.Qt.UserRole)
+            obj = current.data(OBJECT_ROLE)
             self.current_object = obj
-            self.current_item = self.listWidget.currentItem()
-            print('clicking the item')
-            self.name.setText(obj.get_name())
-            self.position.setText(str(obj.get_position())[1:-1])
-            self.color.setText(str(obj.get_color())[1:-1])
-            self.scale.setText(str(obj.get_scale())[1:-1])
-            self.rotation.setText(str(obj.get_rotation())[1:-1])
-            self.translation.setText(str(obj.get_translation())[1:-1])
-            if self.listWidget.count() == 0:
-                self.current_item = None
-                self.current_object = None
+            if obj is None:
+                return
+            print(obj.get_name())
+            self.show_object(obj)
         except:
             print("Error locating current item")
 
 
+    def show_object(self, obj):
+        """Fill the property fields from `obj` without writing them back."""
+        fields = [(self.name, obj.get_name()),
+                  (self.position, format_vector(obj.get_position())),
+                  (self.color, format_vector(obj.get_color())),
+                  (self.scale, format_vector(obj.get_scale())),
+                  (self.rotation, format_vector(obj.get_rotation())),
+                  (self.translation, format_vector(obj.get_translation()))]
+        for field, text in fields:
+            blocked = field.blockSignals(True)
+            field.setText(text)
+            field.blockSignals(blocked)
+
+
+    def selected_rows(self):
+        """Store rows of every selected object, read from the selection ranges."""
+        selection = self.objectFilter.mapSelectionToSource(self.listView.selectionModel().selection())
+        ranges = [np.arange(r.top(), r.bottom() + 1) for r in selection]
+        return np.unique(np.concatenate(ranges)) if ranges else np.zeros(0, dtype=np.intp)
+
+
+    @Slot()
+    def apply_bulk(self):
+        """Apply the bulk edit to every selected object with one store, save and redraw call."""
+        rows = self.selected_rows()
+        if not len(rows):
+            return
+        try:
+            values = [float(s) for s in self.bulkValue.text().split(',')]
+        except ValueError:
+            print("invalid input")
+            return
+        if len(values) > 3:
+            print("invalid input")
+            return
+
+        mode = self.bulkMode.currentText()
+        column = self.bulkColumn.currentText()
+        if mode == BULK_SCALE:
+            # A single factor scales uniformly
+            factors = values * 3 if len(values) == 1 else values + [1.0] * (3 - len(values))
+            self.store.scale_rows(rows, factors)
+        elif mode == BULK_SET:
+            # A single value sets all three components, "scale 2" must not flatten objects
+            values = values * 3 if len(values) == 1 else values + [0.0] * (3 - len(values))
+            self.store.set_rows(rows, column, values)
+        else:
+            values += [0.0] * (3 - len(values))
+            self.store.offset_rows(rows, column, values)
+
+        self.persistence.put_many(self.store.states(rows))
+        self.glWidget.mark_dirty(DIRTY_SCENE)
+        if self.current_object is not None and self.current_object.store is not None:
+            self.show_object(self.current_object)
+
+
+    @Slot(int)
+    def select_picked(self, row):
+        index = self.objectFilter.mapFromSource(self.objectModel.index(row))
+        if index.isValid():
+            self.listView.setCurrentIndex(index)
+
+
     @Slot()
     def change_name(self):
         if not self.name.text():
             pass
         else:
             try:
+                # Names are not drawn, the list view follows the store's rename notification
                 self.current_object.set_name(self.name.text())
-                self.current_item.setText(self.name.text())
-                self.glWidget.setObjList(self.object_list)
-                f = open('cache','wb')
-                pickle.dump(self.object_list, f)
-                f.close()
+                self.save_object(self.current_object)
             except:
                 print("Name change error")
 
@@ -331,10 +427,8 @@ class Widget(QWidget):
                     print('here')
                     li.append(0)
                 self.current_object.set_position(li)
-                self.glWidget.setObjList(self.object_list)
-                f = open('cache','wb')
-                pickle.dump(self.object_list, f)
-                f.close()
+                self.glWidget.mark_dirty(DIRTY_SCENE)
+                self.save_object(self.current_object)
             except:
                 print("invalid input")
             print(self.current_object.get_position())
@@ -356,10 +450,8 @@ class Widget(QWidget):
                     print('here')
                     li.append(0)
                 self.current_object.set_color(li)
-                self.glWidget.setObjList(self.object_list)
-                f = open('cache','wb')
-                pickle.dump(self.object_list, f)
-                f.close()
+                self.glWidget.mark_dirty(DIRTY_SCENE)
+                self.save_object(self.current_object)
             except:
                 print("invalid input")
             print(self.current_object.get_color())
@@ -381,10 +473,8 @@ class Widget(QWidget):
                     print('here')
                     li.append(0)
                 self.current_object.set_scale(li)
-                self.glWidget.setObjList(self.object_list)
-                f = open('cache','wb')
-                pickle.dump(self.object_list, f)
-                f.close()
+                self.glWidget.mark_dirty(DIRTY_SCENE)
+                self.save_object(self.current_object)
             except:
                 print("invalid input")
             print(self.current_object.get_scale())
@@ -406,10 +496,8 @@ class Widget(QWidget):
                     print('here')
                     li.append(0)
                 self.current_object.set_rotation(li)
-                self.glWidget.setObjList(self.object_list)
-                f = open('cache','wb')
-                pickle.dump(self.object_list, f)
-                f.close()
+                self.glWidget.mark_dirty(DIRTY_SCENE)
+                self.save_object(self.current_object)
             except:
                 print("invalid input")
             print(self.current_object.get_rotation())
@@ -431,10 +519,8 @@ class Widget(QWidget):
                     print('here')
                     li.append(0)
                 self.current_object.set_translation(li)
-                self.glWidget.setObjList(self.object_list)
-                f = open('cache','wb')
-                pickle.dump(self.object_list, f)
-                f.close()
+                self.glWidget.mark_dirty(DIRTY_SCENE)
+                self.save_object(self.current_object)
             except:
                 print("invalid input")
             print(self.current_object.get_translation())
@@ -463,5 +549,9 @@ if __name__ == '__main__':
     window.resize(800, 600)
     window.show()
     res = app.exec_()
+    widget.importer.cancel()
+    QtCore.QThreadPool.globalInstance().waitForDone()
+    widget.persistence.close()
+    widget.importPool.close()
     widget.glWidget.free_resources()
     sys.exit(res)
\ No newline at end of file
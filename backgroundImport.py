@@ -0,0 +1,197 @@
+"""Mesh import on a QThreadPool, reporting progress back to the main thread"""
+
+import numpy as np
+from PySide2 import QtCore
+
+from objStream import ObjStream
+
+# Share of the progress bar given to parsing, the rest is normals,
+# optimization and levels of detail, which report no progress of their own
+PARSE_PROGRESS = 0.5
+
+
+class _ImportSignals(QtCore.QObject):
+    """Signals of one ImportTask; created on the main thread so they are delivered there."""
+    progress = QtCore.Signal(str, float)
+    placeholder = QtCore.Signal(str, object, object)
+    finished = QtCore.Signal(str, object)
+    failed = QtCore.Signal(str, str)
+    cancelled = QtCore.Signal(str)
+
+
+class ImportTask(QtCore.QRunnable):
+    """Parses, optimizes and simplifies one registered file off the main thread.
+
+    Only builds the MeshData, the main thread adds it to the registry.
+    cancel() is checked after every parsed chunk and before the result is
+    handed over.
+    """
+
+    def __init__(self, registry, name):
+        super().__init__()
+        # Kept alive by BackgroundImporter.tasks, not deleted by the pool
+        self.setAutoDelete(False)
+        self.registry = registry
+        self.name = name
+        self.path = registry.sources[name]
+        self.cancelled = False
+        self.signals = _ImportSignals()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        name, signals = self.name, self.signals
+        try:
+            mesh = self.registry.read_cached(self.path)
+            if mesh is None:
+                parsed = self.parse()
+                if parsed is None:
+                    signals.cancelled.emit(name)
+                    return
+                mesh = self.registry.load_file(self.path, parsed)
+            if self.cancelled:
+                signals.cancelled.emit(name)
+                return
+            signals.progress.emit(name, 1.0)
+            signals.finished.emit(name, mesh)
+        except Exception as e:
+            signals.failed.emit(name, str(e))
+
+    def parse(self):
+        """Return the parsed (vertices, triangles), or None once cancelled.
+
+        With the registry's process pool the file is parsed there in one
+        go, otherwise it is streamed so the placeholder box grows with
+        every chunk.
+        """
+        if self.registry.importPool is not None:
+            vertices, triangles = self.registry.importPool.load(self.path)
+            if len(vertices):
+                positions = vertices.reshape(-1, 3)
+                self.signals.placeholder.emit(self.name, positions.min(axis=0), positions.max(axis=0))
+            self.signals.progress.emit(self.name, PARSE_PROGRESS)
+            return None if self.cancelled else (vertices, triangles)
+
+        stream = ObjStream(self.path)
+        low = np.full(3, np.inf)
+        high = np.full(3, -np.inf)
+        for chunk in stream:
+            if self.cancelled:
+                return None
+            if chunk.vertexStop > chunk.vertexStart:
+                positions = stream.vertices.view()[chunk.vertexStart:chunk.vertexStop]
+                low = np.minimum(low, positions.min(axis=0))
+                high = np.maximum(high, positions.max(axis=0))
+                self.signals.placeholder.emit(self.name, low.copy(), high.copy())
+            self.signals.progress.emit(self.name, chunk.progress * PARSE_PROGRESS)
+        return stream.vertices.view().reshape(-1), stream.triangles.view().reshape(-1)
+
+
+class LodTask(QtCore.QRunnable):
+    """Builds the levels of detail of a mesh that was loaded without them."""
+
+    def __init__(self, registry, name, mesh):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.registry = registry
+        self.name = name
+        self.mesh = mesh
+        self.signals = _ImportSignals()
+
+    def run(self):
+        try:
+            source = self.registry.sources.get(self.name)
+            lods = self.registry.build_lods(self.mesh, source if isinstance(source, str) else None)
+            self.signals.finished.emit(self.name, (self.mesh, lods))
+        except Exception as e:
+            self.signals.failed.emit(self.name, str(e))
+
+
+class BackgroundImporter(QtCore.QObject):
+    """Runs ImportTasks on a QThreadPool and keeps the registry up to date.
+
+    While a file is imported its id is pending in the registry, drawn as
+    a placeholder box that grows as vertices are read. Every signal is
+    delivered on the main thread; `loaded` fires once the MeshData is in
+    the registry, the GPU upload then happens on the next paint.
+
+    It is also the registry's lodBuilder: meshes loaded on first use get
+    their levels of detail from a LodTask, `lods_changed` fires once they
+    are attached.
+    """
+    progress = QtCore.Signal(str, float)
+    placeholder_changed = QtCore.Signal(str)
+    loaded = QtCore.Signal(str)
+    lods_changed = QtCore.Signal(str)
+    failed = QtCore.Signal(str, str)
+    cancelled = QtCore.Signal(str)
+
+    def __init__(self, registry, threadPool=None, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        self.threadPool = threadPool or QtCore.QThreadPool.globalInstance()
+        self.tasks = {}
+        self.lodTasks = set()
+        registry.lodBuilder = self.build_lods
+
+    def start(self, name):
+        """Import the registered file `name` unless it is loaded or already importing."""
+        if name in self.tasks or name in self.registry.loaded:
+            return
+        self.registry.begin_pending(name)
+        task = ImportTask(self.registry, name)
+        task.signals.progress.connect(self.progress)
+        task.signals.placeholder.connect(self._placeholder)
+        task.signals.finished.connect(self._finished)
+        task.signals.failed.connect(self._failed)
+        task.signals.cancelled.connect(self._cancelled)
+        self.tasks[name] = task
+        self.threadPool.start(task)
+
+    def cancel(self, name=None):
+        """Cancel one import, or every running import without a name."""
+        for task in [self.tasks[name]] if name is not None else self.tasks.values():
+            task.cancel()
+
+    def running(self):
+        return list(self.tasks)
+
+    def build_lods(self, name, mesh):
+        """Build the levels of detail of a loaded mesh on the thread pool."""
+        task = LodTask(self.registry, name, mesh)
+        task.signals.finished.connect(self._lods_finished)
+        task.signals.failed.connect(self._lods_failed)
+        self.lodTasks.add(task)
+        self.threadPool.start(task)
+
+    def _placeholder(self, name, low, high):
+        if name in self.tasks:
+            self.registry.set_placeholder(name, low, high)
+            self.placeholder_changed.emit(name)
+
+    def _finished(self, name, mesh):
+        self.tasks.pop(name, None)
+        self.registry.add_loaded(name, mesh)
+        self.loaded.emit(name)
+
+    def _lods_finished(self, name, result):
+        mesh, lods = result
+        self.lodTasks = {task for task in self.lodTasks if task.signals is not self.sender()}
+        if self.registry.set_lods(name, mesh, lods):
+            self.lods_changed.emit(name)
+
+    def _lods_failed(self, name, message):
+        # The mesh keeps drawing at full detail
+        self.lodTasks = {task for task in self.lodTasks if task.signals is not self.sender()}
+        print(f"Levels of detail of {name} failed:", message)
+
+    def _failed(self, name, message):
+        self.tasks.pop(name, None)
+        self.registry.end_pending(name)
+        self.failed.emit(name, message)
+
+    def _cancelled(self, name):
+        self.tasks.pop(name, None)
+        self.registry.end_pending(name)
+        self.cancelled.emit(name)
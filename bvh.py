@@ -0,0 +1,192 @@
+"""Bounding volume hierarchies over axis-aligned boxes, queried with rays"""
+
+import numpy as np
+
+# Primitives per leaf, small leaves keep the final exact tests cheap
+LEAF_SIZE = 4
+
+
+def _raySlab(origin, invDirection, boxMin, boxMax, tMax):
+    """Return (hit mask, entry distance) of a ray against many boxes."""
+    with np.errstate(invalid='ignore'):
+        t1 = (boxMin - origin) * invDirection
+        t2 = (boxMax - origin) * invDirection
+        tLow = np.minimum(t1, t2)
+        tHigh = np.maximum(t1, t2)
+    # 0 * inf: the ray runs inside a slab plane, which counts as inside the slab
+    tLow[np.isnan(tLow)] = -np.inf
+    tHigh[np.isnan(tHigh)] = np.inf
+    tNear = np.maximum(tLow.max(axis=1), 0.0)
+    tFar = tHigh.min(axis=1)
+    hit = (tFar >= tNear) & (tNear <= tMax) & np.all(boxMin <= boxMax, axis=1)
+    return hit, tNear
+
+
+def rayTriangles(origin, direction, v0, v1, v2):
+    """Ray parameter t of the hit with each triangle, inf where it misses.
+
+    Moller-Trumbore over (N, 3) corner arrays; both faces count as hits.
+    """
+    edge1 = v1 - v0
+    edge2 = v2 - v0
+    p = np.cross(direction, edge2)
+    det = np.einsum('ij,ij->i', edge1, p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        invDet = 1.0 / det
+        s = origin - v0
+        u = np.einsum('ij,ij->i', s, p) * invDet
+        q = np.cross(s, edge1)
+        v = (q @ direction) * invDet
+        t = np.einsum('ij,ij->i', edge2, q) * invDet
+        hit = (np.abs(det) > 1e-12) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+class BVH:
+    """Binary tree of axis-aligned boxes over primitives given by their bounds.
+
+    Built top down, splitting at the median of the primitive centers along
+    their longest axis. Nodes live in flat arrays with the root at 0. A leaf
+    covers `order[start[i]:start[i] + count[i]]`, inner nodes have count 0
+    and two children. Primitives with non-finite bounds get an empty box
+    and are never hit.
+
+    Ray queries walk the tree breadth first, so every level of the tree is
+    one vectorized slab test. refit() updates the boxes above a single
+    primitive in O(depth) without rebuilding.
+    """
+
+    def __init__(self, boxMin, boxMax, leafSize=LEAF_SIZE):
+        self.primMin = np.array(boxMin, dtype=np.float64).reshape(-1, 3)
+        self.primMax = np.array(boxMax, dtype=np.float64).reshape(-1, 3)
+        self._clear_invalid(slice(None))
+        self.leafSize = leafSize
+        self._build()
+
+    def __len__(self):
+        return len(self.primMin)
+
+    def _clear_invalid(self, prims):
+        boxMin = self.primMin[prims]
+        boxMax = self.primMax[prims]
+        invalid = ~(np.isfinite(boxMin).all(axis=-1) & np.isfinite(boxMax).all(axis=-1))
+        boxMin[invalid] = np.inf
+        boxMax[invalid] = -np.inf
+        self.primMin[prims] = boxMin
+        self.primMax[prims] = boxMax
+
+    def _build(self):
+        count = len(self.primMin)
+        self.order = np.arange(count)
+        # Empty boxes have no center, park them at the origin for splitting
+        valid = np.all(self.primMin <= self.primMax, axis=1)
+        centers = np.zeros_like(self.primMin)
+        centers[valid] = (self.primMin[valid] + self.primMax[valid]) / 2
+        left, right, start, size, parent = [], [], [], [], []
+
+        def addNode(first, last, parentNode):
+            left.append(-1)
+            right.append(-1)
+            start.append(first)
+            size.append(last - first)
+            parent.append(parentNode)
+            return len(left) - 1
+
+        stack = [addNode(0, count, -1)]
+        while stack:
+            node = stack.pop()
+            first, n = start[node], size[node]
+            if n <= self.leafSize:
+                continue
+            prims = self.order[first:first + n]
+            extent = centers[prims].max(axis=0) - centers[prims].min(axis=0)
+            axis = int(np.argmax(extent))
+            half = n // 2
+            self.order[first:first + n] = prims[np.argpartition(centers[prims, axis], half)]
+            size[node] = 0
+            left[node] = addNode(first, first + half, node)
+            right[node] = addNode(first + half, first + n, node)
+            stack += (left[node], right[node])
+
+        self.left = np.array(left)
+        self.right = np.array(right)
+        self.start = np.array(start)
+        self.count = np.array(size)
+        self.parent = np.array(parent)
+        self.primLeaf = np.empty(count, dtype=np.int64)
+        leaves = np.flatnonzero(self.count)
+        for leaf in leaves:
+            self.primLeaf[self.order[self.start[leaf]:self.start[leaf] + self.count[leaf]]] = leaf
+
+        self.nodeMin = np.full((len(left), 3), np.inf)
+        self.nodeMax = np.full((len(left), 3), -np.inf)
+        # Children always come after their parent, so one reverse pass fills every box
+        for node in range(len(left) - 1, -1, -1):
+            self._update_node(node)
+
+    def _update_node(self, node):
+        if self.count[node]:
+            prims = self.order[self.start[node]:self.start[node] + self.count[node]]
+            self.nodeMin[node] = self.primMin[prims].min(axis=0)
+            self.nodeMax[node] = self.primMax[prims].max(axis=0)
+        elif self.left[node] >= 0:
+            children = [self.left[node], self.right[node]]
+            self.nodeMin[node] = self.nodeMin[children].min(axis=0)
+            self.nodeMax[node] = self.nodeMax[children].max(axis=0)
+
+    def refit(self, prim, boxMin, boxMax):
+        """Move one primitive to new bounds and update the boxes above it."""
+        self.primMin[prim] = boxMin
+        self.primMax[prim] = boxMax
+        self._clear_invalid([prim])
+        node = self.primLeaf[prim]
+        while node >= 0:
+            self._update_node(node)
+            node = self.parent[node]
+
+    def ray_candidates(self, origin, direction, tMax=np.inf):
+        """Primitives whose box the ray enters, with their entry t, nearest first."""
+        origin = np.asarray(origin, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            invDirection = 1.0 / np.asarray(direction, dtype=np.float64)
+
+        leaves = []
+        nodes = np.zeros(1, dtype=np.int64)
+        while len(nodes):
+            hit, _ = _raySlab(origin, invDirection, self.nodeMin[nodes], self.nodeMax[nodes], tMax)
+            nodes = nodes[hit]
+            isLeaf = self.count[nodes] > 0
+            leaves.append(nodes[isLeaf])
+            inner = nodes[~isLeaf]
+            nodes = np.concatenate((self.left[inner], self.right[inner]))
+
+        leaves = np.concatenate(leaves)
+        counts = self.count[leaves]
+        # order[start:start + count] of every hit leaf, gathered without a loop
+        offsets = np.repeat(self.start[leaves] - np.cumsum(counts) + counts, counts)
+        prims = self.order[offsets + np.arange(counts.sum())]
+
+        hit, tNear = _raySlab(origin, invDirection, self.primMin[prims], self.primMax[prims], tMax)
+        prims, tNear = prims[hit], tNear[hit]
+        nearest = np.argsort(tNear, kind='stable')
+        return prims[nearest], tNear[nearest]
+
+
+class MeshBVH(BVH):
+    """Triangle BVH of one mesh for exact ray hits."""
+
+    def __init__(self, vertices, triangles, leafSize=LEAF_SIZE):
+        self.positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        corners = self.positions[self.triangles]
+        super().__init__(corners.min(axis=1), corners.max(axis=1), leafSize)
+
+    def intersect_ray(self, origin, direction, tMax=np.inf):
+        """Ray parameter t of the nearest triangle hit, or None."""
+        tris, _ = self.ray_candidates(origin, direction, tMax)
+        if len(tris) == 0:
+            return None
+        corners = self.positions[self.triangles[tris]]
+        t = rayTriangles(np.asarray(origin, dtype=np.float64), np.asarray(direction, dtype=np.float64),
+                         corners[:, 0], corners[:, 1], corners[:, 2]).min()
+        return float(t) if np.isfinite(t) and t <= tMax else None
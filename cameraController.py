@@ -0,0 +1,185 @@
+"""Keyboard and mouse camera navigation advanced on a fixed timestep"""
+
+from math import asin, atan2, exp
+
+import numpy as np
+from PySide2 import QtCore
+from PySide2.QtCore import Qt
+
+from glmatrix import quat_identity, quat_rotateX, quat_rotateY, vec3_transformQuat
+
+# Simulation step in seconds, frames run as many steps as the time they took
+FIXED_STEP = 1 / 120
+# Steps run in one frame at most, so a stall does not make the camera jump
+MAX_STEPS = 8
+
+# Units per second, radians per second and radians per pixel of mouse movement
+MOVE_SPEED = 3.0
+TURN_SPEED = 2.0
+LOOK_SENSITIVITY = 0.005
+# How fast velocities follow the keys, per second, and the speed counted as stopped
+RESPONSE = 12.0
+STOP_SPEED = 1e-3
+
+# Pitch stays short of straight up or down, where yaw is undefined
+MAX_PITCH = 1.55
+
+# Drag modes
+LOOK = 'look'
+ORBIT = 'orbit'
+
+# Key: (axis, direction) with axes 0-2 right, up and back in camera space and 3 yaw
+KEY_BINDINGS = {
+    Qt.Key_W: (2, -1.0),
+    Qt.Key_S: (2, 1.0),
+    Qt.Key_A: (0, -1.0),
+    Qt.Key_D: (0, 1.0),
+    Qt.Key_R: (1, -1.0),
+    Qt.Key_F: (1, 1.0),
+    Qt.Key_Q: (3, -1.0),
+    Qt.Key_E: (3, 1.0),
+}
+
+
+class CameraController(QtCore.QObject):
+    """Moves the renderer's camera from the keys held down and mouse drags.
+
+    Key presses and releases only update the set of held keys; the camera
+    moves in advance(), called once per painted frame, by the time elapsed
+    since the previous frame in FIXED_STEP increments. Velocities ease
+    towards the held keys, so motion starts and stops smoothly and does
+    not depend on the keyboard repeat rate. While the camera moves
+    advance() returns True and the widget schedules the next frame; with
+    buffer swaps synced to the display, frames then follow the refresh
+    rate, and an idle camera renders nothing.
+
+    The orientation is kept as yaw and pitch, rebuilt with quat_rotateY
+    and quat_rotateX, so it never rolls. Dragging in LOOK mode turns the
+    camera in place, in ORBIT mode it circles the point in front of it.
+    `changed` asks for a frame after input.
+    """
+    changed = QtCore.Signal()
+
+    def __init__(self, renderer, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.keys = set()
+        self.velocity = np.zeros(3)
+        self.turnVelocity = 0.0
+        self.clock = QtCore.QElapsedTimer()
+        self.lag = 0.0
+
+        forward = vec3_transformQuat(np.zeros(3), (0, 0, -1), renderer.camRotation)
+        self.yaw = atan2(-forward[0], -forward[2])
+        self.pitch = asin(max(-1.0, min(1.0, forward[1])))
+
+        self.dragMode = None
+        self.dragPos = None
+        self.orbitCenter = None
+        self.orbitDistance = 0.0
+
+    @property
+    def moving(self):
+        return bool(self.keys) or self.turnVelocity != 0.0 or self.velocity.any()
+
+    def key_pressed(self, key):
+        """Hold `key`; returns False for keys that do not move the camera."""
+        if key not in KEY_BINDINGS:
+            return False
+        if key not in self.keys:
+            self.keys.add(key)
+            self.changed.emit()
+        return True
+
+    def key_released(self, key):
+        if key not in KEY_BINDINGS:
+            return False
+        self.keys.discard(key)
+        return True
+
+    def release_all(self):
+        """Forget held keys, e.g. when focus moves elsewhere and their releases would be missed."""
+        self.keys.clear()
+
+    def begin_drag(self, mode, x, y):
+        self.dragMode = mode
+        self.dragPos = (x, y)
+        if mode == ORBIT:
+            # Orbit the point in front of the camera at the depth of the scene origin
+            position = np.asarray(self.renderer.camPosition, dtype=np.float64)
+            forward = self.forward()
+            self.orbitDistance = float(np.dot(-position, forward))
+            if self.orbitDistance < 0.1:
+                self.orbitDistance = float(np.linalg.norm(position)) or 1.0
+            self.orbitCenter = position + forward * self.orbitDistance
+
+    def drag(self, x, y):
+        if self.dragMode is None:
+            return
+        dx, dy = x - self.dragPos[0], y - self.dragPos[1]
+        self.dragPos = (x, y)
+        if self.dragMode == ORBIT:
+            # Dragging moves the scene with the mouse, so the camera turns the other way
+            dx, dy = -dx, -dy
+        self.turn(-dx * LOOK_SENSITIVITY, -dy * LOOK_SENSITIVITY)
+        if self.dragMode == ORBIT:
+            position = self.orbitCenter - self.forward() * self.orbitDistance
+            self.renderer.camPosition[:] = position.tolist()
+        self.changed.emit()
+
+    def end_drag(self):
+        self.dragMode = None
+
+    def forward(self):
+        return vec3_transformQuat(np.zeros(3), (0, 0, -1), self.renderer.camRotation)
+
+    def turn(self, yaw, pitch=0.0):
+        self.yaw += yaw
+        self.pitch = max(-MAX_PITCH, min(MAX_PITCH, self.pitch + pitch))
+        rotation = self.renderer.camRotation
+        quat_identity(rotation)
+        quat_rotateY(rotation, rotation, self.yaw)
+        quat_rotateX(rotation, rotation, self.pitch)
+
+    def advance(self):
+        """Step the camera by the time since the last frame; returns True while it is moving."""
+        if not self.moving:
+            self.clock.invalidate()
+            return False
+        if not self.clock.isValid():
+            # First frame of a movement, start timing from here
+            self.clock.start()
+            self.lag = FIXED_STEP
+        else:
+            self.lag += self.clock.restart() / 1000.0
+        steps = min(int(self.lag / FIXED_STEP), MAX_STEPS)
+        self.lag = min(self.lag - steps * FIXED_STEP, FIXED_STEP)
+        for _ in range(steps):
+            self.step(FIXED_STEP)
+
+        if not self.keys and abs(self.turnVelocity) < STOP_SPEED and np.abs(self.velocity).max() < STOP_SPEED:
+            self.velocity[:] = 0.0
+            self.turnVelocity = 0.0
+            self.clock.invalidate()
+            return False
+        return True
+
+    def step(self, dt):
+        target = np.zeros(4)
+        for key in self.keys:
+            axis, direction = KEY_BINDINGS[key]
+            target[axis] += direction
+        blend = 1.0 - exp(-RESPONSE * dt)
+        self.velocity += (target[:3] * MOVE_SPEED - self.velocity) * blend
+        self.turnVelocity += (target[3] * TURN_SPEED - self.turnVelocity) * blend
+
+        if self.turnVelocity:
+            self.turn(self.turnVelocity * dt)
+        if self.velocity.any():
+            # Strafe and walk in camera space, rise and fall along world up
+            right, up, back = self.velocity * dt
+            offset = vec3_transformQuat(np.zeros(3), (right, 0.0, back), self.renderer.camRotation)
+            offset[1] += up
+            position = self.renderer.camPosition
+            for i in range(3):
+                position[i] += offset[i]
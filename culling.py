@@ -0,0 +1,41 @@
+"""Vectorized visibility tests of bounding spheres against the view frustum"""
+
+import numpy as np
+
+
+def frustumPlanes(matViewProjection):
+    """Return the six frustum planes of a column-major clip matrix as a (6, 4) array.
+
+    Each row (a, b, c, d) is normalized so that a*x + b*y + c*z + d is the
+    signed distance of a world point to the plane, positive inside.
+    Planes are ordered left, right, bottom, top, near, far.
+    """
+    # Stored column-major, the transpose gives the rows of the matrix
+    rows = np.asarray(matViewProjection, dtype=np.float64).reshape(4, 4).T
+    planes = np.array([rows[3] + rows[0], rows[3] - rows[0],
+                       rows[3] + rows[1], rows[3] - rows[1],
+                       rows[3] + rows[2], rows[3] - rows[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def transformSpheres(models, centers, radii):
+    """Move local bounding spheres into world space.
+
+    `models` are flat column-major model matrices, shape (N, 16). The radius
+    grows with the largest axis scale, so the world sphere still encloses
+    the transformed mesh under non-uniform scale.
+    """
+    models = np.asarray(models, dtype=np.float64).reshape(-1, 4, 4)
+    linear = models[:, :3, :3]
+    worldCenters = np.einsum('nij,ni->nj', linear, centers) + models[:, 3, :3]
+    worldRadii = radii * np.linalg.norm(linear, axis=2).max(axis=1)
+    return worldCenters, worldRadii
+
+
+def spheresInFrustum(planes, centers, radii):
+    """Boolean mask of the spheres at least partly inside all six planes.
+
+    Spheres with a NaN radius are always outside.
+    """
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -radii[:, None], axis=1)
@@ -0,0 +1,176 @@
+"""Named per-frame CPU and GPU timing scopes with rolling percentiles"""
+
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.error import GLError, NullFunctionError
+
+NS_PER_MS = 1e6
+
+
+class _NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SCOPE = _NullScope()
+
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'gpu', 'start', 'query')
+
+    def __init__(self, profiler, name, gpu):
+        self.profiler = profiler
+        self.name = name
+        self.gpu = gpu
+
+    def __enter__(self):
+        self.query = self.profiler._begin_query(self.name) if self.gpu else None
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._cpuFrame[self.name] += time.perf_counter_ns() - self.start
+        if self.query is not None:
+            self.profiler._end_query()
+        return False
+
+
+class FrameProfiler:
+    """Times named phases of each frame on the CPU and on the GPU.
+
+    Wrap work in `with profiler.scope('name'):` between begin_frame() and
+    end_frame(). A scope entered several times in one frame adds up.
+    CPU times come from perf_counter_ns. GPU times come from GL_TIME_ELAPSED
+    queries, which are read back once their results are available, usually
+    a few frames later, so the pipeline never waits on them. Only one such
+    query can run at a time, so a scope opened inside another GPU-timed
+    scope is timed on the CPU only.
+
+    The last `history` frames of every scope are kept for percentiles.
+    While disabled, scope() returns a shared no-op context manager.
+    """
+
+    def __init__(self, history=240, enabled=False):
+        self.history = history
+        self.enabled = enabled
+        self.gpu = False
+        self.cpu = defaultdict(lambda: deque(maxlen=self.history))
+        self.gpuTimes = defaultdict(lambda: deque(maxlen=self.history))
+        self.frames = 0
+
+        self._cpuFrame = defaultdict(int)
+        self._frameStart = None
+        self._gpuFrame = []
+        self._activeQuery = None
+        self._pending = deque()
+        self._freeQueries = []
+
+    def initialize(self):
+        """Check for timer query support, the context must be current."""
+        try:
+            self._freeQueries = list(np.atleast_1d(glGenQueries(16)))
+            self.gpu = True
+        except (GLError, NullFunctionError) as e:
+            print("GPU timing unavailable:", e)
+            self.gpu = False
+
+    def free(self):
+        queries = self._freeQueries + [query for frame in self._pending for _, query in frame]
+        if queries:
+            glDeleteQueries(len(queries), queries)
+        self._freeQueries = []
+        self._pending.clear()
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self._frameStart = None
+
+    def clear(self):
+        """Forget all recorded times."""
+        self.cpu.clear()
+        self.gpuTimes.clear()
+        self.frames = 0
+
+    def scope(self, name, gpu=True):
+        """Context manager timing the enclosed block under `name`."""
+        if not self.enabled or self._frameStart is None:
+            return _NULL_SCOPE
+        return _Scope(self, name, gpu and self.gpu and self._activeQuery is None)
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.collect_gpu()
+        self._cpuFrame.clear()
+        self._gpuFrame = []
+        self._frameStart = time.perf_counter_ns()
+
+    def end_frame(self):
+        if self._frameStart is None:
+            return
+        self._cpuFrame['frame'] += time.perf_counter_ns() - self._frameStart
+        self._frameStart = None
+        for name, ns in self._cpuFrame.items():
+            self.cpu[name].append(ns)
+        if self._gpuFrame:
+            self._pending.append(self._gpuFrame)
+        self.frames += 1
+
+    def percentiles(self, name, q=(50, 95, 99), gpu=False):
+        """Percentiles of a scope's per-frame time in milliseconds, or None if never recorded."""
+        samples = (self.gpuTimes if gpu else self.cpu).get(name)
+        if not samples:
+            return None
+        return np.percentile(np.fromiter(samples, dtype=np.float64), q) / NS_PER_MS
+
+    def summary(self, q=(50, 95, 99)):
+        """{name: {'cpu': ms percentiles, 'gpu': ms percentiles or None}} for every scope."""
+        return {name: {'cpu': self.percentiles(name, q), 'gpu': self.percentiles(name, q, gpu=True)}
+                for name in self.cpu}
+
+    def report(self):
+        """Multi-line text table of p50/p95/p99 times in milliseconds."""
+        lines = [f'{"scope":<12}{"cpu p50/p95/p99":>22}{"gpu p50/p95/p99":>22}']
+        for name, times in self.summary().items():
+            columns = [' / '.join(f'{v:.2f}' for v in t) if t is not None else '-'
+                       for t in (times['cpu'], times['gpu'])]
+            lines.append(f'{name:<12}{columns[0]:>22}{columns[1]:>22}')
+        return '\n'.join(lines)
+
+    def _begin_query(self, name):
+        if not self._freeQueries:
+            self._freeQueries = list(np.atleast_1d(glGenQueries(16)))
+        query = self._freeQueries.pop()
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        self._activeQuery = query
+        self._gpuFrame.append((name, query))
+        return query
+
+    def _end_query(self):
+        glEndQuery(GL_TIME_ELAPSED)
+        self._activeQuery = None
+
+    def collect_gpu(self, block=False):
+        """Read back finished frames, oldest first.
+
+        begin_frame() does this without blocking. Pass block=True to wait
+        for every pending frame, e.g. before a final report.
+        """
+        while self._pending:
+            frame = self._pending[0]
+            # Queries finish in submission order, the last one gates the frame
+            if not block and not glGetQueryObjectiv(frame[-1][1], GL_QUERY_RESULT_AVAILABLE):
+                break
+            self._pending.popleft()
+            totals = defaultdict(int)
+            for name, query in frame:
+                totals[name] += glGetQueryObjectui64v(query, GL_QUERY_RESULT)
+                self._freeQueries.append(query)
+            for name, ns in totals.items():
+                self.gpuTimes[name].append(ns)
@@ -0,0 +1,78 @@
+"""Per-frame camera and light state shared by every program through one std140 uniform buffer"""
+
+import numpy as np
+from OpenGL.GL import *
+
+# Uniform buffer binding point of the FrameData block
+FRAME_DATA_BINDING = 0
+
+# Paste after the #version line of any shader that needs camera or light state
+FRAME_DATA_BLOCK = '''layout(std140) uniform FrameData {
+    mat4 uViewMatrix;
+    mat4 uProjectionMatrix;
+    vec4 uCameraPosition;
+    vec4 uLightPosition;
+    vec4 uAmbientColor;
+    vec4 uDiffuseColor;
+    vec4 uSpecularColor;
+    float uFogDensity;
+};
+'''
+
+# std140 offsets of the block members in floats, vec3 values are padded to vec4
+FRAME_DATA_OFFSETS = {
+    'view': 0,
+    'projection': 16,
+    'cameraPosition': 32,
+    'lightPosition': 36,
+    'ambientColor': 40,
+    'diffuseColor': 44,
+    'specularColor': 48,
+    'fogDensity': 52,
+}
+FRAME_DATA_FLOATS = 56
+
+
+class FrameUniforms:
+    """CPU copy and GPU buffer of the FrameData block.
+
+    The buffer is attached to FRAME_DATA_BINDING once, when it is created,
+    and programs are pointed at that binding with attach(). set() only
+    changes the CPU copy, upload() sends it when something changed.
+    """
+
+    def __init__(self):
+        self.data = np.zeros(FRAME_DATA_FLOATS, dtype=np.float32)
+        self.changed = True
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_DATA_BINDING, self.buffer)
+
+    @staticmethod
+    def attach(program):
+        """Read the FrameData block of `program` from the shared binding point."""
+        index = glGetUniformBlockIndex(program, 'FrameData')
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(program, index, FRAME_DATA_BINDING)
+
+    def set(self, **values):
+        """Set block members by their FRAME_DATA_OFFSETS name, e.g. set(view=matView)."""
+        for name, value in values.items():
+            value = np.ravel(value)
+            offset = FRAME_DATA_OFFSETS[name]
+            self.data[offset:offset + len(value)] = value
+        self.changed = True
+
+    def upload(self):
+        if not self.changed:
+            return
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.changed = False
+
+    def free(self):
+        glDeleteBuffers(1, [self.buffer])
+        self.buffer = None
@@ -68,6 +68,40 @@ def quat_rotateY(out, a, rad):
   out[3] = aw * bw - ay * by;
   return out;
 
+def quat_rotateX(out, a, rad):
+  rad *= 0.5;
+  ax = a[0]
+  ay = a[1]
+  az = a[2]
+  aw = a[3];
+  bx = sin(rad)
+  bw = cos(rad);
+  out[0] = ax * bw + aw * bx;
+  out[1] = ay * bw + az * bx;
+  out[2] = az * bw - ay * bx;
+  out[3] = aw * bw - ax * bx;
+  return out;
+
+def vec3_transformQuat(out, a, q):
+  qx = q[0]
+  qy = q[1]
+  qz = q[2]
+  qw = q[3];
+  x = a[0]
+  y = a[1]
+  z = a[2];
+  uvx = qy * z - qz * y;
+  uvy = qz * x - qx * z;
+  uvz = qx * y - qy * x;
+  uuvx = qy * uvz - qz * uvy;
+  uuvy = qz * uvx - qx * uvz;
+  uuvz = qx * uvy - qy * uvx;
+  w2 = qw * 2;
+  out[0] = x + uvx * w2 + uuvx * 2;
+  out[1] = y + uvy * w2 + uuvy * 2;
+  out[2] = z + uvz * w2 + uuvz * 2;
+  return out;
+
 
 def quat_fromEuler(out, x, y, z):
   halfToRad = (0.5 * pi) / 180.0;
@@ -364,3 +398,136 @@ def mat4_perspective(out, fovy, aspect, near, far):
   out[14] = 2 * far * near * nf;
   return out;
 
+
+# Batched versions of the functions above. They work on N transforms at once:
+# quaternions are (N, 4), vectors (N, 3) and matrices (N, 16) or (N, 4, 4),
+# every row in the same column-major layout as mat4_create / mat3_create.
+# Inputs of a single transform broadcast against the batch. Passing
+# out=None allocates the result.
+
+def _batch_out(out, n, size):
+  if out is None:
+    return np.empty((n, size))
+  return out
+
+def _columns(a, size):
+  a = np.asarray(a, dtype=np.float64)
+  return a.reshape(-1, size).T
+
+def quat_fromEuler_batch(out, euler):
+  e = np.asarray(euler, dtype=np.float64).reshape(-1, 3) * ((0.5 * pi) / 180.0)
+  out = _batch_out(out, len(e), 4)
+  flat = out.reshape(-1, 4)
+  sx = np.sin(e[:, 0])
+  cx = np.cos(e[:, 0])
+  sy = np.sin(e[:, 1])
+  cy = np.cos(e[:, 1])
+  sz = np.sin(e[:, 2])
+  cz = np.cos(e[:, 2])
+  flat[:, 0] = sx * cy * cz - cx * sy * sz
+  flat[:, 1] = cx * sy * cz + sx * cy * sz
+  flat[:, 2] = cx * cy * sz - sx * sy * cz
+  flat[:, 3] = cx * cy * cz + sx * sy * sz
+  return out
+
+def mat3_invert_batch(out, a):
+  a00, a01, a02, a10, a11, a12, a20, a21, a22 = _columns(a, 9)
+  b01 = a22 * a11 - a12 * a21
+  b11 = -a22 * a10 + a12 * a20
+  b21 = a21 * a10 - a11 * a20
+  # Calculate the determinants
+  det = 1.0 / (a00 * b01 + a01 * b11 + a02 * b21)
+  out = _batch_out(out, len(det), 9)
+  flat = out.reshape(-1, 9)
+  flat[:, 0] = b01 * det
+  flat[:, 1] = (-a22 * a01 + a02 * a21) * det
+  flat[:, 2] = (a12 * a01 - a02 * a11) * det
+  flat[:, 3] = b11 * det
+  flat[:, 4] = (a22 * a00 - a02 * a20) * det
+  flat[:, 5] = (-a12 * a00 + a02 * a10) * det
+  flat[:, 6] = b21 * det
+  flat[:, 7] = (-a21 * a00 + a01 * a20) * det
+  flat[:, 8] = (a11 * a00 - a01 * a10) * det
+  return out
+
+def mat4_multiply_batch(out, a, b):
+  # Stored column-major, so the row-major product a * b is b @ a here
+  a = np.asarray(a, dtype=np.float64).reshape(-1, 4, 4)
+  b = np.asarray(b, dtype=np.float64).reshape(-1, 4, 4)
+  n = max(len(a), len(b))
+  out = _batch_out(out, n, 16)
+  np.matmul(b, a, out=out.reshape(-1, 4, 4))
+  return out
+
+def mat4_fromRotationTranslationScale_batch(out, q, v, s):
+  x, y, z, w = _columns(q, 4)
+  v = np.asarray(v, dtype=np.float64).reshape(-1, 3)
+  sx, sy, sz = _columns(s, 3)
+  n = max(len(x), len(v), len(sx))
+  out = _batch_out(out, n, 16)
+  flat = out.reshape(-1, 16)
+  # Quaternion math
+  x2 = x + x
+  y2 = y + y
+  z2 = z + z
+  xx = x * x2
+  xy = x * y2
+  xz = x * z2
+  yy = y * y2
+  yz = y * z2
+  zz = z * z2
+  wx = w * x2
+  wy = w * y2
+  wz = w * z2
+  flat[:, 0] = (1 - (yy + zz)) * sx
+  flat[:, 1] = (xy + wz) * sx
+  flat[:, 2] = (xz - wy) * sx
+  flat[:, 3] = 0
+  flat[:, 4] = (xy - wz) * sy
+  flat[:, 5] = (1 - (xx + zz)) * sy
+  flat[:, 6] = (yz + wx) * sy
+  flat[:, 7] = 0
+  flat[:, 8] = (xz + wy) * sz
+  flat[:, 9] = (yz - wx) * sz
+  flat[:, 10] = (1 - (xx + yy)) * sz
+  flat[:, 11] = 0
+  flat[:, 12:15] = v
+  flat[:, 15] = 1
+  return out
+
+def mat4_invert_batch(out, a):
+  (a00, a01, a02, a03, a10, a11, a12, a13,
+   a20, a21, a22, a23, a30, a31, a32, a33) = _columns(a, 16)
+  b00 = a00 * a11 - a01 * a10
+  b01 = a00 * a12 - a02 * a10
+  b02 = a00 * a13 - a03 * a10
+  b03 = a01 * a12 - a02 * a11
+  b04 = a01 * a13 - a03 * a11
+  b05 = a02 * a13 - a03 * a12
+  b06 = a20 * a31 - a21 * a30
+  b07 = a20 * a32 - a22 * a30
+  b08 = a20 * a33 - a23 * a30
+  b09 = a21 * a32 - a22 * a31
+  b10 = a21 * a33 - a23 * a31
+  b11 = a22 * a33 - a23 * a32
+  # Calculate the determinants
+  det = 1.0 / (b00 * b11 - b01 * b10 + b02 * b09 + b03 * b08 - b04 * b07 + b05 * b06)
+  out = _batch_out(out, len(det), 16)
+  flat = out.reshape(-1, 16)
+  flat[:, 0] = (a11 * b11 - a12 * b10 + a13 * b09) * det
+  flat[:, 1] = (a02 * b10 - a01 * b11 - a03 * b09) * det
+  flat[:, 2] = (a31 * b05 - a32 * b04 + a33 * b03) * det
+  flat[:, 3] = (a22 * b04 - a21 * b05 - a23 * b03) * det
+  flat[:, 4] = (a12 * b08 - a10 * b11 - a13 * b07) * det
+  flat[:, 5] = (a00 * b11 - a02 * b08 + a03 * b07) * det
+  flat[:, 6] = (a32 * b02 - a30 * b05 - a33 * b01) * det
+  flat[:, 7] = (a20 * b05 - a22 * b02 + a23 * b01) * det
+  flat[:, 8] = (a10 * b10 - a11 * b08 + a13 * b06) * det
+  flat[:, 9] = (a01 * b08 - a00 * b10 - a03 * b06) * det
+  flat[:, 10] = (a30 * b04 - a31 * b02 + a33 * b00) * det
+  flat[:, 11] = (a21 * b02 - a20 * b04 - a23 * b00) * det
+  flat[:, 12] = (a11 * b07 - a10 * b09 - a12 * b06) * det
+  flat[:, 13] = (a00 * b09 - a01 * b07 + a02 * b06) * det
+  flat[:, 14] = (a31 * b01 - a30 * b03 - a32 * b00) * det
+  flat[:, 15] = (a20 * b03 - a21 * b01 + a22 * b00) * det
+  return out
@@ -0,0 +1,324 @@
+"""GPU mesh storage shared by every draw in GLWidget"""
+
+from collections import OrderedDict
+from ctypes import c_void_p
+
+import numpy as np
+from OpenGL.GL import *
+
+from vertexLayout import buildVertexLayout, NORMAL_OCTAHEDRAL
+
+# Attribute slots shared by every program
+ATTRIB_POSITION = 0
+ATTRIB_INSTANCE_COLOR = 1
+# A mat4 attribute takes four consecutive slots, 2 to 5
+ATTRIB_INSTANCE_MODEL = 2
+ATTRIB_NORMAL = 6
+
+_GL_TYPES = {
+    'float': GL_FLOAT,
+    'short': GL_SHORT,
+    'int_2_10_10_10_rev': GL_INT_2_10_10_10_REV,
+}
+_GL_INDEX_TYPES = {2: GL_UNSIGNED_SHORT, 4: GL_UNSIGNED_INT}
+_ATTRIB_SLOTS = {'aVertexPosition': ATTRIB_POSITION, 'aVertexNormal': ATTRIB_NORMAL}
+
+# Default VRAM budget for mesh vertex and index buffers
+DEFAULT_GPU_BUDGET = 256 << 20
+
+# Per-instance record: rgba color followed by a column-major model matrix
+INSTANCE_FLOATS = 4 + 16
+INSTANCE_STRIDE = INSTANCE_FLOATS * 4
+
+
+class GpuMesh:
+    """One geometry uploaded once to a VAO with its own vertex and index buffer.
+
+    No CPU copy is kept, the MeshRegistry owns the source arrays.
+    """
+
+    def __init__(self):
+        self.mode = GL_TRIANGLES
+        self.indexCount = 0
+        self.indexType = GL_UNSIGNED_INT
+        self.nbytes = 0
+        # Dequantization of the stored positions, see VertexLayout
+        self.positionScale = None
+        self.positionOffset = None
+        self.report = ''
+        self.vao = None
+        self.vbo = None
+        self.ibo = None
+        self.instanceBuffer = None
+        self.instanceCount = 0
+
+    def upload(self, layout):
+        """Create the VAO and copy the interleaved vertices and indices of a VertexLayout to the GPU."""
+        self.indexCount = layout.indexCount
+        self.indexType = _GL_INDEX_TYPES[layout.indices.dtype.itemsize]
+        self.nbytes = layout.nbytes
+        self.positionScale = layout.positionScale
+        self.positionOffset = layout.positionOffset
+        self.report = layout.report()
+
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, layout.data.nbytes, layout.data, GL_STATIC_DRAW)
+        for name, components, kind, normalized, offset in layout.attributes:
+            location = _ATTRIB_SLOTS[name]
+            glVertexAttribPointer(location, components, _GL_TYPES[kind], GL_TRUE if normalized else GL_FALSE,
+                                  layout.stride, c_void_p(offset))
+            glEnableVertexAttribArray(location)
+
+        # The element buffer binding is part of the VAO state
+        self.ibo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, layout.indices.nbytes, layout.indices, GL_STATIC_DRAW)
+
+        self._create_instance_buffer()
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def _create_instance_buffer(self):
+        """Per-instance color and model matrix, advanced once per instance, in the bound VAO."""
+        self.instanceBuffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceBuffer)
+        glVertexAttribPointer(ATTRIB_INSTANCE_COLOR, 4, GL_FLOAT, GL_FALSE, INSTANCE_STRIDE, c_void_p(0))
+        glEnableVertexAttribArray(ATTRIB_INSTANCE_COLOR)
+        glVertexAttribDivisor(ATTRIB_INSTANCE_COLOR, 1)
+        for column in range(4):
+            location = ATTRIB_INSTANCE_MODEL + column
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, INSTANCE_STRIDE, c_void_p(16 + 16 * column))
+            glEnableVertexAttribArray(location)
+            glVertexAttribDivisor(location, 1)
+
+    def draw(self):
+        glBindVertexArray(self.vao)
+        glDrawElements(self.mode, self.indexCount, self.indexType, c_void_p(0))
+
+    def upload_instances(self, instances):
+        """Replace the per-instance data with an (N, INSTANCE_FLOATS) float32 array."""
+        glBindBuffer(GL_ARRAY_BUFFER, self.instanceBuffer)
+        # Orphan the previous storage so the driver does not wait on the last frame
+        glBufferData(GL_ARRAY_BUFFER, instances.nbytes, instances, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.instanceCount = len(instances)
+
+    def draw_instanced(self):
+        glBindVertexArray(self.vao)
+        glDrawElementsInstanced(self.mode, self.indexCount, self.indexType, c_void_p(0), self.instanceCount)
+
+    def free(self):
+        """Release the GL objects."""
+        if self.vao is None:
+            return
+        glDeleteBuffers(3, [self.vbo, self.ibo, self.instanceBuffer])
+        glDeleteVertexArrays(1, [self.vao])
+        self.vao = None
+        self.vbo = None
+        self.ibo = None
+        self.instanceBuffer = None
+        self.instanceCount = 0
+
+
+class StreamingGpuMesh(GpuMesh):
+    """A GpuMesh filled chunk by chunk while its file is still being parsed.
+
+    Only float positions are stored, normals and quantization need the
+    whole mesh. The buffers start at the given capacities, in vertices and
+    indices, and double when a chunk does not fit; the old contents are
+    copied on the GPU. Every append() is drawn from the next frame on.
+    Without normals it is only drawn in the renderer's placeholder pass,
+    MeshCache.get() does not hand it to the lit draw paths.
+    """
+
+    def __init__(self, vertexCapacity=1 << 16, indexCapacity=1 << 18):
+        super().__init__()
+        self.vertexCount = 0
+        self.vertexCapacity = vertexCapacity
+        self.indexCapacity = indexCapacity
+        self.positionScale = np.ones(3, dtype=np.float32)
+        self.positionOffset = np.zeros(3, dtype=np.float32)
+
+    def begin(self):
+        """Create the VAO and the empty vertex and index buffers."""
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        self.vbo = self._allocate(GL_ARRAY_BUFFER, self.vertexCapacity * 12)
+        glVertexAttribPointer(ATTRIB_POSITION, 3, GL_FLOAT, GL_FALSE, 0, c_void_p(0))
+        glEnableVertexAttribArray(ATTRIB_POSITION)
+        self.ibo = self._allocate(GL_ELEMENT_ARRAY_BUFFER, self.indexCapacity * 4)
+        self._create_instance_buffer()
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.nbytes = self.vertexCapacity * 12 + self.indexCapacity * 4
+
+    @staticmethod
+    def _allocate(target, size):
+        buffer = glGenBuffers(1)
+        glBindBuffer(target, buffer)
+        glBufferData(target, size, None, GL_DYNAMIC_DRAW)
+        return buffer
+
+    @staticmethod
+    def _grow(buffer, used, size):
+        """Return a new buffer of `size` bytes holding the first `used` bytes of `buffer`."""
+        grown = glGenBuffers(1)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, grown)
+        glBufferData(GL_COPY_WRITE_BUFFER, size, None, GL_DYNAMIC_DRAW)
+        if used:
+            glBindBuffer(GL_COPY_READ_BUFFER, buffer)
+            glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, used)
+        glDeleteBuffers(1, [buffer])
+        return grown
+
+    def append(self, vertices, triangles):
+        """Add flat float32 vertices and flat triangles indexing every vertex appended so far."""
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1)
+        triangles = np.ascontiguousarray(triangles, dtype=np.uint32).reshape(-1)
+        vertexCount = self.vertexCount + len(vertices) // 3
+        indexCount = self.indexCount + len(triangles)
+
+        glBindVertexArray(self.vao)
+        if vertexCount > self.vertexCapacity:
+            capacity = max(vertexCount, 2 * self.vertexCapacity)
+            self.vbo = self._grow(self.vbo, self.vertexCount * 12, capacity * 12)
+            self.vertexCapacity = capacity
+            # The attribute keeps the buffer it was set up with, point it at the new one
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glVertexAttribPointer(ATTRIB_POSITION, 3, GL_FLOAT, GL_FALSE, 0, c_void_p(0))
+        if indexCount > self.indexCapacity:
+            capacity = max(indexCount, 2 * self.indexCapacity)
+            self.ibo = self._grow(self.ibo, self.indexCount * 4, capacity * 4)
+            self.indexCapacity = capacity
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+
+        if len(vertices):
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferSubData(GL_ARRAY_BUFFER, self.vertexCount * 12, vertices.nbytes, vertices)
+        if len(triangles):
+            glBufferSubData(GL_ELEMENT_ARRAY_BUFFER, self.indexCount * 4, triangles.nbytes, triangles)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        self.vertexCount = vertexCount
+        self.indexCount = indexCount
+        self.nbytes = self.vertexCapacity * 12 + self.indexCapacity * 4
+        self.report = f'streaming, {self.vertexCount} vertices, {self.indexCount // 3} triangles'
+
+
+class MeshCache:
+    """GPU meshes keyed by (geometry id, level of detail), uploaded from a MeshRegistry on first use.
+
+    Meshes are kept in least recently used order. Once the uploaded buffers
+    exceed `memoryBudget` bytes, the oldest meshes no scene object references
+    are released; they are uploaded again if they are drawn later.
+    Must only be used while the owning GL context is current.
+
+    Vertices are uploaded in the compact layout given by `quantize` and
+    `normalEncoding`, see vertexLayout.buildVertexLayout. Programs drawing
+    these meshes must be built for the same normal encoding.
+    """
+
+    def __init__(self, registry, memoryBudget=DEFAULT_GPU_BUDGET, quantize=True,
+                 normalEncoding=NORMAL_OCTAHEDRAL):
+        self.registry = registry
+        self.memoryBudget = memoryBudget
+        self.quantize = quantize
+        self.normalEncoding = normalEncoding
+        self.memoryUsed = 0
+        self.meshes = OrderedDict()
+        # Meshes still being parsed. They have positions only, so the renderer
+        # draws them in its placeholder pass and get() never returns them
+        self.streams = {}
+        self.box = None
+
+    def get(self, name, lod=0):
+        """Return the uploaded mesh for `name` at level `lod`, or None if it is unknown or still streaming."""
+        if name in self.streams:
+            return None
+        key = (name, lod)
+        mesh = self.meshes.get(key)
+        if mesh is not None:
+            self.meshes.move_to_end(key)
+            return mesh
+        # Meshes imported in the background are drawn as placeholder_box() until they arrive
+        if name not in self.registry or name in self.registry.pending:
+            return None
+
+        data = self.registry.get(name).level(lod)
+        mesh = GpuMesh()
+        mesh.upload(buildVertexLayout(data.vertices, data.normals, data.triangles,
+                                      self.quantize, self.normalEncoding))
+        self.meshes[key] = mesh
+        self.memoryUsed += mesh.nbytes
+        self.evict(keep=key)
+        return mesh
+
+    def evict(self, keep=None):
+        """Release unreferenced meshes, oldest first, until within budget."""
+        for key in list(self.meshes):
+            if self.memoryUsed <= self.memoryBudget:
+                break
+            if key != keep and key[0] not in self.registry.referenced:
+                self.release(key)
+
+    def placeholder_box(self):
+        """Line mesh of the edges of the [-1, 1] cube, uploaded on first use."""
+        if self.box is None:
+            corners = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=np.float32)
+            # Corner indices differing in exactly one bit share an edge
+            edges = [(a, a | bit) for a in range(8) for bit in (1, 2, 4) if not a & bit]
+            self.box = GpuMesh()
+            self.box.upload(buildVertexLayout(corners, np.zeros_like(corners), edges,
+                                              False, self.normalEncoding))
+            self.box.mode = GL_LINES
+        return self.box
+
+    def begin_stream(self, name, vertexCapacity=1 << 16, indexCapacity=1 << 18):
+        """Draw `name` from a StreamingGpuMesh filled by append_stream() until end_stream()."""
+        self.end_stream(name)
+        stream = StreamingGpuMesh(vertexCapacity, indexCapacity)
+        stream.begin()
+        self.streams[name] = stream
+        self.memoryUsed += stream.nbytes
+        return stream
+
+    def append_stream(self, name, vertices, triangles):
+        stream = self.streams[name]
+        self.memoryUsed -= stream.nbytes
+        stream.append(vertices, triangles)
+        self.memoryUsed += stream.nbytes
+        self.evict()
+
+    def end_stream(self, name):
+        """Drop the streamed copy; the next get() uploads the finished mesh from the registry."""
+        stream = self.streams.pop(name, None)
+        if stream is not None:
+            self.memoryUsed -= stream.nbytes
+            stream.free()
+        for key in [key for key in self.meshes if key[0] == name]:
+            self.release(key)
+
+    def report(self):
+        """One line per uploaded mesh with its layout and the bytes saved against plain floats."""
+        return '\n'.join(f'{name} lod {lod}: {mesh.report}' for (name, lod), mesh in self.meshes.items())
+
+    def release(self, key):
+        mesh = self.meshes.pop(key, None)
+        if mesh is not None:
+            self.memoryUsed -= mesh.nbytes
+            mesh.free()
+
+    def free(self):
+        for mesh in list(self.meshes.values()) + list(self.streams.values()):
+            mesh.free()
+        self.meshes.clear()
+        self.streams.clear()
+        if self.box is not None:
+            self.box.free()
+            self.box = None
+        self.memoryUsed = 0
@@ -0,0 +1,209 @@
+"""Import-time mesh optimization: vertex welding, vertex cache and fetch ordering, overdraw ordering"""
+
+from collections import deque
+
+import numpy as np
+
+# Positions closer than this fraction of the bounding box diagonal are welded
+WELD_TOLERANCE = 1e-6
+
+# FIFO post-transform cache size that orders are tuned and measured for
+VERTEX_CACHE_SIZE = 16
+
+# Triangles per cluster when sorting for overdraw
+OVERDRAW_CLUSTER = 64
+
+
+def weldVertices(vertices, triangles, tolerance=WELD_TOLERANCE):
+    """Merge vertices whose positions are equal within `tolerance`.
+
+    Positions are snapped to a grid of `tolerance` times the bounding box
+    diagonal, so two points just either side of a grid line stay apart.
+    Triangles that collapse to a line or a point are dropped.
+    Returns flat float32 vertices and flat uint32 triangles.
+    """
+    positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    tris = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.zeros(0, np.float32), np.zeros(0, np.uint32)
+
+    cell = tolerance * np.linalg.norm(positions.max(axis=0) - positions.min(axis=0))
+    keys = np.round(positions / cell).astype(np.int64) if cell > 0 else positions
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    tris = inverse.reshape(-1)[tris]
+    valid = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 2] != tris[:, 0])
+    return (positions[first].astype(np.float32).reshape(-1),
+            tris[valid].astype(np.uint32).reshape(-1))
+
+
+def cacheMetrics(triangles, cacheSize=VERTEX_CACHE_SIZE):
+    """Return (ACMR, ATVR) of drawing `triangles` through a FIFO vertex cache.
+
+    ACMR is the number of cache misses per triangle, ATVR the number of
+    misses per distinct vertex; 1.0 is the best possible ATVR.
+    """
+    indices = np.asarray(triangles).reshape(-1).tolist()
+    if not indices:
+        return 0.0, 0.0
+    cache = deque()
+    cached = set()
+    misses = 0
+    for vertex in indices:
+        if vertex not in cached:
+            misses += 1
+            cache.append(vertex)
+            cached.add(vertex)
+            if len(cache) > cacheSize:
+                cached.discard(cache.popleft())
+    return misses / (len(indices) / 3), misses / len(set(indices))
+
+
+def optimizeVertexCache(triangles, vertexCount=None, cacheSize=VERTEX_CACHE_SIZE):
+    """Reorder triangles for post-transform cache hits with Tipsify.
+
+    Tipsify (Sander, Nehab and Barczak 2007) emits every remaining
+    triangle around a fanning vertex, then moves to the neighbour that is
+    most likely still cached and will not be evicted before its own
+    triangles are emitted. Winding is kept. Returns flat uint32 triangles.
+    """
+    tris = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if len(tris) == 0:
+        return np.zeros(0, np.uint32)
+    if vertexCount is None:
+        vertexCount = int(tris.max()) + 1
+
+    # Triangles around vertex v are adjacency[offsets[v]:offsets[v + 1]]
+    flat = tris.reshape(-1)
+    adjacency = (np.argsort(flat, kind='stable') // 3).tolist()
+    live = np.bincount(flat, minlength=vertexCount)
+    offsets = np.concatenate(([0], np.cumsum(live))).tolist()
+    live = live.tolist()
+    corners = tris.tolist()
+
+    timestamps = [0] * vertexCount
+    emitted = [False] * len(corners)
+    deadEnd = []
+    order = []
+    stamp = cacheSize + 1
+    cursor = 0
+    fan = corners[0][0]
+    while fan >= 0:
+        candidates = []
+        for tri in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[tri]:
+                continue
+            emitted[tri] = True
+            order.append(tri)
+            for vertex in corners[tri]:
+                deadEnd.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if stamp - timestamps[vertex] > cacheSize:
+                    timestamps[vertex] = stamp
+                    stamp += 1
+
+        # Prefer the neighbour in the cache the longest that is still safe to fan
+        fan, best = -1, -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                age = stamp - timestamps[vertex]
+                priority = age if age + 2 * live[vertex] <= cacheSize else 0
+                if priority > best:
+                    fan, best = vertex, priority
+        # Dead end: back up to a recently used vertex, then to any vertex left
+        while fan < 0 and deadEnd:
+            vertex = deadEnd.pop()
+            if live[vertex] > 0:
+                fan = vertex
+        if fan < 0:
+            while cursor < vertexCount and live[cursor] == 0:
+                cursor += 1
+            if cursor < vertexCount:
+                fan = cursor
+
+    return tris[order].astype(np.uint32).reshape(-1)
+
+
+def optimizeOverdraw(vertices, triangles, clusterSize=OVERDRAW_CLUSTER):
+    """Reorder clusters of consecutive triangles so outward facing ones come first.
+
+    Clusters are scored by how far their center lies along their average
+    normal, seen from the mesh center. Surfaces on the outside of the mesh
+    are then drawn before those they hide, so more fragments fail the
+    depth test early. Triangle order inside a cluster, and with it most of
+    the vertex cache locality, is kept. Returns flat uint32 triangles.
+    """
+    positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    tris = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if len(tris) <= clusterSize:
+        return tris.astype(np.uint32).reshape(-1)
+
+    corners = positions[tris]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    centers = corners.mean(axis=1)
+    meshCenter = (centers * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-30)
+
+    clusters = np.arange(len(tris)) // clusterSize
+    clusterCount = clusters[-1] + 1
+    weights = np.maximum(np.bincount(clusters, areas, clusterCount), 1e-30)
+    clusterCenters = np.stack([np.bincount(clusters, centers[:, axis] * areas, clusterCount)
+                               for axis in range(3)], axis=1) / weights[:, None]
+    clusterNormals = np.stack([np.bincount(clusters, normals[:, axis], clusterCount)
+                               for axis in range(3)], axis=1)
+    lengths = np.linalg.norm(clusterNormals, axis=1)
+    clusterNormals /= np.where(lengths > 0, lengths, 1.0)[:, None]
+    scores = np.einsum('ij,ij->i', clusterCenters - meshCenter, clusterNormals)
+
+    rank = np.empty(clusterCount, dtype=np.int64)
+    rank[np.argsort(-scores, kind='stable')] = np.arange(clusterCount)
+    return tris[np.argsort(rank[clusters], kind='stable')].astype(np.uint32).reshape(-1)
+
+
+def optimizeVertexFetch(vertices, triangles):
+    """Renumber vertices in the order triangles first use them.
+
+    Consecutive draws then read the vertex buffer mostly front to back.
+    Vertices no triangle uses are dropped. Returns flat float32 vertices
+    and flat uint32 triangles.
+    """
+    positions = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    flat = np.asarray(triangles, dtype=np.int64).reshape(-1)
+    used, firstUse = np.unique(flat, return_index=True)
+    order = used[np.argsort(firstUse)]
+    remap = np.empty(len(positions), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return (np.ascontiguousarray(positions[order].reshape(-1)),
+            remap[flat].astype(np.uint32))
+
+
+def optimizeMesh(vertices, triangles, tolerance=WELD_TOLERANCE, overdraw=False,
+                 cacheSize=VERTEX_CACHE_SIZE):
+    """Run the whole pipeline: weld, vertex cache order, optional overdraw order, fetch order.
+
+    Pass tolerance=None to skip welding. Returns (vertices, triangles,
+    report); the report holds (ACMR, ATVR) and the vertex count before and
+    after under 'before' and 'after', see formatReport.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1)
+    triangles = np.asarray(triangles, dtype=np.uint32).reshape(-1)
+    report = {'before': cacheMetrics(triangles, cacheSize) + (len(vertices) // 3,)}
+
+    if tolerance is not None:
+        vertices, triangles = weldVertices(vertices, triangles, tolerance)
+    # Meshes exported as strips or grids can already beat Tipsify, keep their order then
+    reordered = optimizeVertexCache(triangles, len(vertices) // 3, cacheSize)
+    if cacheMetrics(reordered, cacheSize)[0] < cacheMetrics(triangles, cacheSize)[0]:
+        triangles = reordered
+    if overdraw:
+        triangles = optimizeOverdraw(vertices, triangles)
+    vertices, triangles = optimizeVertexFetch(vertices, triangles)
+
+    report['after'] = cacheMetrics(triangles, cacheSize) + (len(vertices) // 3,)
+    return vertices, triangles, report
+
+
+def formatReport(report):
+    before, after = report['before'], report['after']
+    return (f'ACMR {before[0]:.3f} -> {after[0]:.3f}, ATVR {before[1]:.3f} -> {after[1]:.3f}, '
+            f'{before[2]} -> {after[2]} vertices')
@@ -0,0 +1,406 @@
+"""CPU-side mesh registry: meshes are parsed on first use and cached on disk"""
+
+import copy
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from objStream import streamObj
+from meshUtils import computeNormals, boundingSphere
+from meshSimplify import buildLods, MIN_LOD_TRIANGLES
+from meshOptimize import optimizeMesh, formatReport
+
+# Mesh files are looked up next to the sources, not in the working directory
+MESH_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(MESH_DIR, '.meshcache')
+
+# Default budget for parsed meshes held in memory
+DEFAULT_CPU_BUDGET = 512 << 20
+
+# Bump when the parsed arrays change meaning, invalidates every cache file
+CACHE_VERSION = 4
+
+
+class MeshData:
+    """Flat float32 vertices and normals with flat uint32 triangle indices.
+
+    `lods` holds simplified versions of the mesh as MeshData, each with
+    about half the triangles of the one before, or None while they are
+    still to be built, see MeshRegistry.build_lods. `report` holds the
+    meshOptimize report of an optimized mesh, see formatReport.
+    """
+
+    def __init__(self, vertices, triangles, normals=None, lods=()):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.uint32)
+        if normals is None:
+            normals = computeNormals(self.vertices, self.triangles)
+        self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        self.center, self.radius = boundingSphere(self.vertices)
+        self.lods = None if lods is None else list(lods)
+        self.report = None
+
+    @property
+    def nbytes(self):
+        return (self.vertices.nbytes + self.triangles.nbytes + self.normals.nbytes +
+                sum(lod.nbytes for lod in self.lods or ()))
+
+    def level(self, lod):
+        """The mesh for level of detail `lod`, 0 being this full resolution mesh."""
+        return self.lods[lod - 1] if lod else self
+
+    @classmethod
+    def simplified(cls, vertices, triangles, optimize=True, lods=True):
+        """Build a mesh, together with its levels of detail unless `lods` is False.
+
+        Without them `lods` is left None for MeshRegistry.build_lods,
+        except for meshes too small to have any. With `optimize`,
+        duplicate positions are welded first and every level is reordered
+        for the vertex cache and vertex fetches.
+        """
+        report = None
+        if optimize:
+            vertices, triangles, report = optimizeMesh(vertices, triangles)
+        mesh = cls(vertices, triangles, lods=None)
+        mesh.report = report
+        if lods or not hasLods(mesh.triangles):
+            mesh.lods = [cls(*level) for level in lodLevels(mesh.vertices, mesh.triangles, optimize)]
+        return mesh
+
+
+def hasLods(triangles):
+    """Whether a mesh is big enough for buildLods to make any level of it."""
+    return len(triangles) // 3 >= 2 * MIN_LOD_TRIANGLES
+
+
+def lodLevels(vertices, triangles, optimize=True):
+    """The simplified (vertices, triangles) levels of a mesh, run in import workers too."""
+    if not hasLods(triangles):
+        return []
+    levels = []
+    for lodVertices, lodTriangles in buildLods(vertices, triangles):
+        if optimize:
+            lodVertices, lodTriangles, _ = optimizeMesh(lodVertices, lodTriangles, tolerance=None)
+        levels.append((lodVertices, lodTriangles))
+    return levels
+
+
+def _fileDigest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cachedMesh(cached):
+    # A negative count marks an entry written before the levels were built
+    lods = None if int(cached['lods']) < 0 else [
+        MeshData(cached[f'lod{level}_vertices'], cached[f'lod{level}_triangles'], cached[f'lod{level}_normals'])
+        for level in range(1, int(cached['lods']) + 1)]
+    mesh = MeshData(cached['vertices'], cached['triangles'], cached['normals'], lods)
+    report = cached['report'].tolist()
+    mesh.report = {'before': (report[0], report[1], int(report[2])),
+                   'after': (report[3], report[4], int(report[5]))}
+    return mesh
+
+
+class MeshRegistry:
+    """Maps geometry ids to MeshData, loading each source only once.
+
+    Sources are either in-memory arrays or OBJ files. A parsed file is kept
+    as an .npz in `cacheDir`. The cache entry is reused while the file size
+    and mtime are unchanged. If they changed but the content hash did not,
+    the entry is reused too. Pass cacheDir=None to disable the disk cache.
+
+    Loaded meshes are kept in least recently used order. Once they exceed
+    `memoryBudget` bytes, the oldest meshes not in `referenced` (the ids
+    used by scene objects) are dropped and reloaded on their next use.
+
+    With an `importPool` (a parallelImport.ObjImportPool), files are parsed
+    in worker processes, and preload() parses a whole batch at once.
+
+    Levels of detail are slow to build, so meshes loaded on first use get
+    them later: `lodBuilder(name, mesh)` is called to build them in the
+    background, see backgroundImport, and hand them to set_lods(). Until
+    then the mesh has no levels. Without a lodBuilder they are built
+    right away.
+    """
+
+    def __init__(self, cacheDir=CACHE_DIR, memoryBudget=DEFAULT_CPU_BUDGET, importPool=None):
+        self.cacheDir = cacheDir
+        self.memoryBudget = memoryBudget
+        self.importPool = importPool
+        self.lodBuilder = None
+        self.memoryUsed = 0
+        self.sources = {}
+        self.loaded = OrderedDict()
+        self.referenced = set()
+        # Bounding spheres and LOD counts outlive eviction, they are tiny and needed every frame
+        self.bounds = {}
+        self.lodCounts = {}
+        # Ids being imported in the background, with the (low, high) box read so far
+        self.pending = {}
+
+    def register_arrays(self, name, vertices, triangles):
+        self.sources[name] = (vertices, triangles)
+        self.unload(name)
+        self.bounds.pop(name, None)
+        self.lodCounts.pop(name, None)
+
+    def register_file(self, name, path=None):
+        """Register an OBJ file, relative paths are resolved against MESH_DIR.
+
+        Without `path` the id itself is the path, so ids of imported files
+        stay valid across sessions.
+        """
+        self.sources[name] = os.path.join(MESH_DIR, path or name)
+        self.unload(name)
+        self.bounds.pop(name, None)
+        self.lodCounts.pop(name, None)
+        return name
+
+    def names(self):
+        return list(self.sources)
+
+    def __contains__(self, name):
+        return name in self.sources
+
+    def get(self, name):
+        """Return the MeshData for `name`, loading it on first use."""
+        mesh = self.loaded.get(name)
+        if mesh is not None:
+            self.loaded.move_to_end(name)
+            return mesh
+
+        self.end_pending(name)
+        source = self.sources[name]
+        if isinstance(source, str):
+            mesh = self._load_file(source)
+        else:
+            mesh = MeshData.simplified(*source, lods=False)
+        return self._add(name, mesh)
+
+    def preload(self, names):
+        """Load several meshes, parsing every uncached file in the import pool at once.
+
+        Without an import pool this is the same as calling get() on each
+        name. A file that fails to parse is reported and left unloaded.
+        """
+        pending = []
+        for name in names:
+            source = self.sources[name]
+            if name in self.loaded:
+                continue
+            if self.importPool is None or not isinstance(source, str):
+                self.get(name)
+                continue
+            mesh, _ = self._read_cache(source, os.stat(source)) if os.path.isfile(source) else (None, None)
+            if mesh is not None:
+                self._add(name, mesh)
+            else:
+                pending.append(name)
+
+        parsed = self.importPool.load_many([self.sources[name] for name in pending]) if pending else []
+        for name, result in zip(pending, parsed):
+            if isinstance(result, Exception):
+                print(f"Import of {self.sources[name]} failed:", result)
+            else:
+                self._add(name, self._load_file(self.sources[name], result))
+
+    def begin_pending(self, name):
+        """Mark `name` as being imported elsewhere, see backgroundImport.
+
+        Until add_loaded() or end_pending(), it has the bounds of its
+        placeholder box, a unit cube until set_placeholder() says more, and
+        no levels of detail, so drawing it never loads it here.
+        """
+        self.pending[name] = (-np.ones(3), np.ones(3))
+        self.bounds[name] = (np.zeros(3), float(np.sqrt(3)))
+        self.lodCounts[name] = 0
+
+    def set_placeholder(self, name, low, high):
+        if name in self.pending:
+            low, high = np.asarray(low, dtype=np.float64), np.asarray(high, dtype=np.float64)
+            self.pending[name] = (low, high)
+            self.bounds[name] = ((low + high) / 2, float(np.linalg.norm(high - low) / 2))
+
+    def end_pending(self, name):
+        if self.pending.pop(name, None) is not None:
+            self.bounds.pop(name, None)
+            self.lodCounts.pop(name, None)
+
+    def add_loaded(self, name, mesh):
+        """Add a mesh built elsewhere, e.g. by load_file() on a worker thread."""
+        self.end_pending(name)
+        self.unload(name)
+        return self._add(name, mesh)
+
+    def build_lods(self, mesh, path=None):
+        """Build the levels of detail of `mesh`, in the import pool if there is one.
+
+        With the `path` of its file, the cache entry is rewritten with
+        them. Leaves `mesh` alone and is safe to call from worker threads;
+        hand the result to set_lods().
+        """
+        args = (mesh.vertices, mesh.triangles, mesh.report is not None)
+        levels = self.importPool.call(lodLevels, *args) if self.importPool is not None else lodLevels(*args)
+        lods = [MeshData(*level) for level in levels]
+        if path is not None and self.cacheDir is not None:
+            complete = copy.copy(mesh)
+            complete.lods = lods
+            self._store(self._cache_path(path), complete, os.stat(path), _fileDigest(path))
+        return lods
+
+    def set_lods(self, name, mesh, lods):
+        """Attach levels built by build_lods(); returns False if `mesh` was unloaded meanwhile."""
+        if self.loaded.get(name) is not mesh:
+            return False
+        self.memoryUsed -= mesh.nbytes
+        mesh.lods = lods
+        self.memoryUsed += mesh.nbytes
+        self.lodCounts[name] = len(lods)
+        self.evict(keep=name)
+        return True
+
+    def _add(self, name, mesh):
+        self.loaded[name] = mesh
+        self.bounds[name] = (mesh.center, mesh.radius)
+        if mesh.lods is None:
+            if self.lodBuilder is not None:
+                self.lodBuilder(name, mesh)
+            else:
+                source = self.sources[name]
+                mesh.lods = self.build_lods(mesh, source if isinstance(source, str) else None)
+        self.lodCounts[name] = len(mesh.lods or ())
+        self.memoryUsed += mesh.nbytes
+        self.evict(keep=name)
+        return mesh
+
+    def get_bounds(self, name):
+        """Return the (center, radius) bounding sphere of `name` in mesh space."""
+        bounds = self.bounds.get(name)
+        if bounds is None:
+            self.get(name)
+            bounds = self.bounds[name]
+        return bounds
+
+    def spheres(self, geometryIds, codes):
+        """Mesh-space (centers, radii) for rows given as codes into `geometryIds`.
+
+        Ids that are not registered get a NaN radius, which fails every
+        distance comparison.
+        """
+        centers = np.zeros((len(geometryIds), 3))
+        radii = np.full(len(geometryIds), np.nan)
+        for code in np.unique(codes):
+            if geometryIds[code] in self.sources:
+                centers[code], radii[code] = self.get_bounds(geometryIds[code])
+        return centers[codes], radii[codes]
+
+    def lod_counts(self, geometryIds, codes):
+        """Number of simplified levels of each row's mesh, 0 for unknown ids."""
+        counts = np.zeros(len(geometryIds), dtype=np.int64)
+        for code in np.unique(codes):
+            name = geometryIds[code]
+            if name in self.sources:
+                if name not in self.lodCounts:
+                    self.get(name)
+                counts[code] = self.lodCounts[name]
+        return counts[codes]
+
+    def report(self):
+        """One line per loaded mesh with what optimization changed, see formatReport."""
+        return '\n'.join(f'{name}: {formatReport(mesh.report)}'
+                         for name, mesh in self.loaded.items() if mesh.report is not None)
+
+    def set_referenced(self, names):
+        """Set the ids used by the scene, these are never evicted."""
+        self.referenced = set(names)
+        self.evict()
+
+    def evict(self, keep=None):
+        """Drop unreferenced meshes, oldest first, until within budget."""
+        for name in list(self.loaded):
+            if self.memoryUsed <= self.memoryBudget:
+                break
+            if name != keep and name not in self.referenced:
+                self.unload(name)
+
+    def unload(self, name):
+        mesh = self.loaded.pop(name, None)
+        if mesh is not None:
+            self.memoryUsed -= mesh.nbytes
+
+    def _cache_path(self, path):
+        key = hashlib.sha1(os.path.realpath(path).encode()).hexdigest()[:16]
+        return os.path.join(self.cacheDir, f'{os.path.basename(path)}.{key}.npz')
+
+    def read_cached(self, path):
+        """The MeshData of a file from a valid cache entry, or None."""
+        return self._read_cache(path, os.stat(path))[0]
+
+    def load_file(self, path, parsed=None):
+        """Build the MeshData of a file and its levels without adding it, safe to call from worker threads."""
+        return self._load_file(path, parsed, lods=True)
+
+    def _read_cache(self, path, stat):
+        """Return (mesh, digest) from a valid cache entry, or (None, content digest if computed)."""
+        if self.cacheDir is None:
+            return None, None
+        cachePath = self._cache_path(path)
+        digest = None
+        try:
+            with np.load(cachePath) as cached:
+                if int(cached['version']) == CACHE_VERSION:
+                    if int(cached['size']) == stat.st_size and int(cached['mtime']) == stat.st_mtime_ns:
+                        return _cachedMesh(cached), None
+                    digest = _fileDigest(path)
+                    if str(cached['digest']) == digest:
+                        mesh = _cachedMesh(cached)
+                        self._store(cachePath, mesh, stat, digest)
+                        return mesh, digest
+        except (OSError, KeyError, ValueError):
+            pass
+        return None, digest
+
+    def _load_file(self, path, parsed=None, lods=False):
+        """Load a file from the cache, or build it from `parsed` (vertices, triangles) or by parsing it.
+
+        Callers passing `parsed` have found no valid cache entry already.
+        A built mesh only gets its levels of detail with `lods`.
+        """
+        stat = os.stat(path)
+        digest = None
+        if parsed is None:
+            mesh, digest = self._read_cache(path, stat)
+            if mesh is not None:
+                return mesh
+            parsed = self.importPool.load(path) if self.importPool is not None else streamObj(path)
+        mesh = MeshData.simplified(*parsed, lods=False)
+        if lods and mesh.lods is None:
+            mesh.lods = self.build_lods(mesh)
+        if self.cacheDir is not None:
+            self._store(self._cache_path(path), mesh, stat, digest or _fileDigest(path))
+        return mesh
+
+    def _store(self, cachePath, mesh, stat, digest):
+        """Write the cache entry atomically, a failed write only costs a re-parse."""
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            tmpPath = f'{cachePath}.{os.getpid()}.tmp'
+            with open(tmpPath, 'wb') as f:
+                arrays = {}
+                for level in range(len(mesh.lods or ()) + 1):
+                    prefix = f'lod{level}_' if level else ''
+                    arrays[prefix + 'vertices'] = mesh.level(level).vertices
+                    arrays[prefix + 'triangles'] = mesh.level(level).triangles
+                    arrays[prefix + 'normals'] = mesh.level(level).normals
+                np.savez(f, version=CACHE_VERSION, size=stat.st_size, mtime=stat.st_mtime_ns,
+                         digest=digest, lods=-1 if mesh.lods is None else len(mesh.lods),
+                         report=mesh.report['before'] + mesh.report['after'], **arrays)
+            os.replace(tmpPath, cachePath)
+        except OSError as e:
+            print("Mesh cache write failed:", e)
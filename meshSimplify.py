@@ -0,0 +1,191 @@
+"""Quadric error metric simplification, used to build mesh levels of detail"""
+
+import heapq
+
+import numpy as np
+
+# Weight of the planes that pin open boundary edges, relative to face planes
+BOUNDARY_WEIGHT = 1000.0
+
+# Coarsest level that is still worth its own draw
+MIN_LOD_TRIANGLES = 32
+
+
+def _faceQuadrics(positions, tris):
+    """Area weighted plane quadrics (F, 4, 4) and unit normals of every face."""
+    corners = positions[tris]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    doubleArea = np.linalg.norm(normals, axis=1)
+    unit = normals / np.where(doubleArea > 0, doubleArea, 1.0)[:, None]
+    planes = np.concatenate((unit, -np.einsum('ij,ij->i', unit, corners[:, 0])[:, None]), axis=1)
+    return planes[:, :, None] * planes[:, None, :] * (doubleArea / 2)[:, None, None], unit
+
+
+def _boundaryQuadrics(positions, tris, unit):
+    """Quadrics of planes through open edges, perpendicular to their face.
+
+    Returns (edge endpoints (B, 2), quadrics (B, 4, 4)).
+    """
+    edges = tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    keys = np.sort(edges, axis=1)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    open_ = counts[inverse.reshape(-1)] == 1
+    edges = edges[open_]
+    faces = np.flatnonzero(open_) // 3
+
+    direction = positions[edges[:, 1]] - positions[edges[:, 0]]
+    normals = np.cross(direction, unit[faces])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1.0)[:, None]
+    planes = np.concatenate((normals, -np.einsum('ij,ij->i', normals, positions[edges[:, 0]])[:, None]), axis=1)
+    weight = BOUNDARY_WEIGHT * np.einsum('ij,ij->i', direction, direction)
+    return edges, planes[:, :, None] * planes[:, None, :] * weight[:, None, None]
+
+
+def _edgeCosts(quadrics, positions, first, second):
+    """Return (costs, target positions) of collapsing each edge first-second.
+
+    The target minimizes the summed quadric. When that system is close to
+    singular, or its solution lies far from the edge, the best of the two
+    endpoints and the midpoint is used instead.
+    """
+    q = quadrics[first] + quadrics[second]
+    a = positions[first]
+    b = positions[second]
+    candidates = np.stack((a, b, (a + b) / 2, (a + b) / 2), axis=1)
+
+    system = q[:, :3, :3]
+    scale = np.trace(system, axis1=1, axis2=2) / 3
+    solvable = np.abs(np.linalg.det(system)) > 1e-9 * scale ** 3
+    if solvable.any():
+        optimum = np.linalg.solve(system[solvable], -q[solvable, :3, 3:4])[:, :, 0]
+        candidates[solvable, 3] = optimum
+    near = np.linalg.norm(candidates[:, 3] - candidates[:, 2], axis=1) <= np.linalg.norm(b - a, axis=1)
+
+    homogeneous = np.concatenate((candidates, np.ones(candidates.shape[:2] + (1,))), axis=2)
+    costs = np.einsum('eki,eij,ekj->ek', homogeneous, q, homogeneous)
+    costs[~(solvable & near), 3] = np.inf
+    best = np.argmin(costs, axis=1)
+    rows = np.arange(len(best))
+    return np.maximum(costs[rows, best], 0.0), candidates[rows, best]
+
+
+def _compact(positions, tris, alive):
+    live = tris[alive]
+    used, inverse = np.unique(live, return_inverse=True)
+    return (positions[used].astype(np.float32).reshape(-1),
+            inverse.reshape(-1).astype(np.uint32))
+
+
+def simplify(vertices, triangles, targets):
+    """Collapse edges by quadric error until each target triangle count is reached.
+
+    Returns one compacted (vertices, triangles) pair per entry of `targets`,
+    taken in decreasing order. Collapses that would flip a face or pinch
+    the surface into a non-manifold shape are skipped. When no edge can be
+    collapsed any more, the remaining targets get the coarsest mesh reached.
+    """
+    positions = np.array(vertices, dtype=np.float64).reshape(-1, 3)
+    tris = np.array(triangles, dtype=np.int64).reshape(-1, 3)
+    targets = sorted(targets, reverse=True)
+    results = []
+
+    faceQuadrics, unit = _faceQuadrics(positions, tris)
+    quadrics = np.zeros((len(positions), 4, 4))
+    for corner in range(3):
+        np.add.at(quadrics, tris[:, corner], faceQuadrics)
+    boundary, boundaryQuadrics = _boundaryQuadrics(positions, tris, unit)
+    for end in range(2):
+        np.add.at(quadrics, boundary[:, end], boundaryQuadrics)
+
+    vertexFaces = [set() for _ in range(len(positions))]
+    for face, tri in enumerate(tris.tolist()):
+        for vertex in tri:
+            vertexFaces[vertex].add(face)
+    alive = np.ones(len(tris), dtype=bool)
+    faceCount = len(tris)
+    removed = np.zeros(len(positions), dtype=bool)
+    # Bumped whenever a vertex moves, heap entries with an old stamp are stale
+    stamps = np.zeros(len(positions), dtype=np.int64)
+
+    edges = np.unique(np.sort(tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1), axis=0)
+    costs, positionsAfter = _edgeCosts(quadrics, positions, edges[:, 0], edges[:, 1])
+    heap = [(cost, first, second, 0, 0, tuple(target))
+            for cost, (first, second), target in zip(costs.tolist(), edges.tolist(), positionsAfter.tolist())]
+    heapq.heapify(heap)
+
+    while targets and faceCount <= targets[0]:
+        results.append(_compact(positions, tris, alive))
+        targets.pop(0)
+
+    while targets and heap:
+        cost, keep, drop, keepStamp, dropStamp, target = heapq.heappop(heap)
+        if removed[keep] or removed[drop] or stamps[keep] != keepStamp or stamps[drop] != dropStamp:
+            continue
+        keepFaces, dropFaces = vertexFaces[keep], vertexFaces[drop]
+        shared = keepFaces & dropFaces
+        if not shared:
+            continue
+
+        # Link condition: the only common neighbours are the tips of the shared faces
+        keepRing = set(tris[list(keepFaces)].ravel().tolist())
+        dropRing = set(tris[list(dropFaces)].ravel().tolist())
+        if len(keepRing & dropRing) - 2 != len(shared):
+            continue
+
+        moved = list((keepFaces | dropFaces) - shared)
+        if moved:
+            corners = positions[tris[moved]]
+            after = corners.copy()
+            after[(tris[moved] == keep) | (tris[moved] == drop)] = target
+            before = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+            normals = np.cross(after[:, 1] - after[:, 0], after[:, 2] - after[:, 0])
+            if np.any(np.einsum('ij,ij->i', before, normals) <= 0):
+                continue
+
+        positions[keep] = target
+        quadrics[keep] += quadrics[drop]
+        removed[drop] = True
+        for face in shared:
+            alive[face] = False
+            for vertex in tris[face].tolist():
+                vertexFaces[vertex].discard(face)
+        faceCount -= len(shared)
+        for face in dropFaces:
+            tris[face][tris[face] == drop] = keep
+            keepFaces.add(face)
+        vertexFaces[drop] = set()
+        stamps[keep] += 1
+
+        neighbours = np.array(sorted(set(tris[list(keepFaces)].ravel().tolist()) - {keep}))
+        if len(neighbours):
+            costs, positionsAfter = _edgeCosts(quadrics, positions, np.full(len(neighbours), keep), neighbours)
+            for cost, other, target in zip(costs.tolist(), neighbours.tolist(), positionsAfter.tolist()):
+                heapq.heappush(heap, (cost, keep, other, stamps[keep], stamps[other], tuple(target)))
+
+        while targets and faceCount <= targets[0]:
+            results.append(_compact(positions, tris, alive))
+            targets.pop(0)
+
+    coarsest = _compact(positions, tris, alive)
+    results += [coarsest] * len(targets)
+    return results
+
+
+def buildLods(vertices, triangles, levels=3, minTriangles=MIN_LOD_TRIANGLES):
+    """Return up to `levels` simplified (vertices, triangles) pairs, each with about half
+    the triangles of the one before.
+
+    Levels below `minTriangles`, or that simplification could not make
+    meaningfully smaller, are left out.
+    """
+    count = len(triangles) // 3
+    targets = [count >> level for level in range(1, levels + 1) if count >> level >= minTriangles]
+    lods = []
+    previous = count
+    for lodVertices, lodTriangles in simplify(vertices, triangles, targets) if targets else []:
+        if len(lodTriangles) // 3 > 0.9 * previous:
+            break
+        lods.append((lodVertices, lodTriangles))
+        previous = len(lodTriangles) // 3
+    return lods
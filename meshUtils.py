@@ -0,0 +1,56 @@
+"""Whole-mesh NumPy operations on flat vertex and triangle arrays"""
+
+import numpy as np
+
+
+def computeNormals(vertices, triangles, weighting='area'):
+    """Return flat float32 unit vertex normals for an indexed triangle mesh.
+
+    weighting='area' sums the unnormalized face normals, so every face counts
+    by its area (the same result as the old per-triangle generateNormals).
+    weighting='angle' sums unit face normals scaled by the corner angle,
+    which does not depend on how the surface was tessellated.
+    Vertices not used by any face keep a zero normal.
+    """
+    positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    tris = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    corners = positions[tris]
+
+    edge1 = corners[:, 1] - corners[:, 0]
+    edge2 = corners[:, 2] - corners[:, 0]
+    faceNormals = np.cross(edge1, edge2)
+
+    if weighting == 'area':
+        contributions = np.repeat(faceNormals[:, None, :], 3, axis=1)
+    elif weighting == 'angle':
+        lengths = np.linalg.norm(faceNormals, axis=1, keepdims=True)
+        unit = np.divide(faceNormals, lengths, out=np.zeros_like(faceNormals), where=lengths > 0)
+        # Edges leaving each corner towards the two other corners of its face
+        toNext = np.roll(corners, -1, axis=1) - corners
+        toPrev = np.roll(corners, 1, axis=1) - corners
+        angles = np.arctan2(np.linalg.norm(np.cross(toNext, toPrev), axis=2),
+                            np.einsum('ijk,ijk->ij', toNext, toPrev))
+        contributions = unit[:, None, :] * angles[:, :, None]
+    else:
+        raise ValueError(f'unknown normal weighting {weighting!r}')
+
+    normals = np.zeros_like(positions)
+    np.add.at(normals, tris.reshape(-1), contributions.reshape(-1, 3))
+
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    return normals.astype(np.float32).reshape(-1)
+
+
+def boundingSphere(vertices):
+    """Return (center, radius) of a sphere enclosing all vertices.
+
+    The center is the middle of the bounding box, which is cheap and at
+    most about 1.7 times larger than the optimal sphere.
+    """
+    positions = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.zeros(3), 0.0
+    center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+    radius = np.sqrt(((positions - center) ** 2).sum(axis=1).max())
+    return center, float(radius)
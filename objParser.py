@@ -0,0 +1,202 @@
+"""Vectorized Wavefront OBJ parsing into GL-ready NumPy arrays"""
+
+import re
+
+import numpy as np
+
+# A trailing comment, and a backslash continuing a record on the next line
+_comment = re.compile(rb'#[^\n]*')
+_continuation = re.compile(rb'\\\r?\n')
+
+# Face records are parsed with their key turned into a 0, which no corner
+# can be, marking where each record starts, and slashes into separators
+_faceTable = bytes.maketrans(b'f/', b'0 ')
+
+_SPACE, _TAB, _LF, _SLASH = 32, 9, 10, 47
+
+
+def recordEnd(data, pos, size):
+    """Offset just past the first line feed at or after `pos` that ends a record, or `size`.
+
+    A line feed escaped by a backslash continues the record, so pieces of
+    a file are never cut there.
+    """
+    while True:
+        end = data.find(b'\n', pos)
+        if end < 0:
+            return size
+        if data[end - 1:end] != b'\\' and data[end - 2:end] != b'\\\r':
+            return end + 1
+        pos = end + 1
+
+
+def _tokensPerLine(buf):
+    """Count whitespace separated tokens on each LF terminated line of `buf`."""
+    space = buf <= _SPACE
+    tokenStart = ~space
+    tokenStart[1:] &= space[:-1]
+    lineStarts = np.concatenate(([0], np.flatnonzero(buf == _LF) + 1))
+    return np.diff(np.searchsorted(np.flatnonzero(tokenStart), lineStarts))
+
+
+def _joinRecords(data, lineStarts, lineEnds, selected):
+    """Concatenate the selected lines, without their trailing comments.
+
+    Records of one kind are usually stored back to back, so the lines are
+    copied as a few contiguous slices of `data` rather than one by one.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], selected, [0])).astype(np.int8)))
+    text = b''.join([data[lineStarts[first]:lineEnds[last - 1]]
+                     for first, last in zip(edges[0::2].tolist(), edges[1::2].tolist())])
+    if b'#' in text:
+        text = _comment.sub(b'', text)
+    return text
+
+
+def _firstFields(buf):
+    """Mark which numbers of slashed face records are vertex indices.
+
+    With slashes read as separators a corner like "3/1/2" yields three
+    numbers, "3//2" two; the vertex index is the one that also starts a
+    whitespace separated token.
+    """
+    separator = buf <= _SPACE
+    slash = buf == _SLASH
+    separator |= slash
+    fieldStart = ~separator
+    fieldStart[1:] &= separator[:-1]
+    # The byte before the first field is the trailing line feed
+    return ~slash[np.flatnonzero(fieldStart) - 1]
+
+
+def _parseVertices(text, count):
+    """Parse the first three components of every vertex record."""
+    values = np.fromstring(text, dtype=np.float32, sep=' ') if text else np.zeros(0, np.float32)
+    if len(values) == 3 * count:
+        return values.reshape(-1, 3)
+    # Some records carry extra components, e.g. the optional w or vertex colors
+    perLine = _tokensPerLine(np.frombuffer(text, dtype=np.uint8))
+    first = np.cumsum(perLine) - perLine
+    return values[first[:, None] + np.arange(3)]
+
+
+def _triangulate(corners, counts):
+    """Fan-triangulate polygons stored back to back in `corners`."""
+    if (counts == 3).all():
+        return corners.reshape(-1, 3)
+    starts = np.cumsum(counts) - counts
+    polygons = counts >= 3
+    counts = counts[polygons]
+    starts = starts[polygons]
+    triCounts = counts - 2
+    totalTris = int(triCounts.sum())
+    if totalTris == 0:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    # Index of each triangle inside its own polygon: 0, 1, ..., k - 3
+    firstTri = np.cumsum(triCounts) - triCounts
+    local = np.arange(totalTris) - np.repeat(firstTri, triCounts)
+    base = np.repeat(starts, triCounts)
+
+    tris = np.empty((totalTris, 3), dtype=np.int64)
+    tris[:, 0] = corners[base]
+    tris[:, 1] = corners[base + local + 1]
+    tris[:, 2] = corners[base + local + 2]
+    return tris
+
+
+def parseChunk(data, vertexBase=0):
+    """Parse the vertex and face records of whole lines of OBJ text.
+
+    `vertexBase` is the number of vertices defined before `data`, it makes
+    negative (relative) face indices absolute when a file is parsed piece
+    by piece. Returns ((V, 3) float32 vertices, (T, 3) int64 zero-based
+    triangles); indices are not checked against the vertex count.
+    """
+    if b'\\' in data:
+        data = _continuation.sub(b' ', data)
+    if not data.endswith(b'\n'):
+        data += b'\n'
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    lineEnds = np.flatnonzero(buf == _LF) + 1
+    lineStarts = np.concatenate(([0], lineEnds[:-1]))
+
+    # Classify every line by the first two bytes of its key
+    keys = lineStarts
+    first = buf[keys]
+    if ((first == _SPACE) | (first == _TAB)).any():
+        # Indented lines, find their first non-blank byte; blank lines get their line feed
+        nonBlank = np.append(np.flatnonzero(buf > _SPACE), len(buf) - 1)
+        keys = np.minimum(nonBlank[np.searchsorted(nonBlank, lineStarts)], lineEnds - 1)
+        first = buf[keys]
+    second = buf[np.minimum(keys + 1, len(buf) - 1)]
+    keyEnds = (second == _SPACE) | (second == _TAB)
+    isVertex = (first == ord('v')) & keyEnds
+    isFace = (first == ord('f')) & keyEnds
+    vertexCount = int(isVertex.sum())
+    faceCount = int(isFace.sum())
+
+    # The key letter cannot appear inside the numbers of its own records
+    vertexText = _joinRecords(data, lineStarts, lineEnds, isVertex).replace(b'v', b' ')
+    vertices = _parseVertices(vertexText, vertexCount)
+
+    if faceCount:
+        faceText = _joinRecords(data, lineStarts, lineEnds, isFace)
+        numbers = np.fromstring(faceText.translate(_faceTable), dtype=np.int64, sep=' ')
+        if b'/' in faceText:
+            numbers = numbers[_firstFields(np.frombuffer(faceText, dtype=np.uint8))]
+
+        if len(numbers) == 4 * faceCount and not numbers[::4].any():
+            # Triangles only, every record is its 0 and three corners
+            counts = np.full(faceCount, 3)
+            corners = numbers.reshape(-1, 4)[:, 1:]
+        else:
+            starts = np.flatnonzero(numbers == 0)
+            if len(starts) != faceCount:
+                # Some corner is an invalid index 0, count the tokens instead
+                tokens = _tokensPerLine(np.frombuffer(faceText, dtype=np.uint8))
+                starts = np.cumsum(tokens) - tokens
+            counts = np.diff(np.append(starts, len(numbers))) - 1
+            corners = np.delete(numbers, starts)
+
+        # Negative indices count back from the last vertex defined so far
+        if corners.min() < 0:
+            verticesBefore = np.repeat(vertexBase + np.cumsum(isVertex)[isFace], counts)
+            corners = np.where(corners < 0, corners + verticesBefore.reshape(corners.shape), corners - 1)
+        else:
+            corners = corners - 1
+        triangles = _triangulate(corners.reshape(-1), counts)
+    else:
+        triangles = np.zeros((0, 3), dtype=np.int64)
+    return vertices, triangles
+
+
+def parseObj(data):
+    """Parse OBJ text into (vertices, triangles).
+
+    `vertices` is a flat contiguous float32 array (x, y, z per vertex) and
+    `triangles` a flat contiguous uint32 array of zero-based indices, both
+    ready to hand to glBufferData without copying. Faces may use v, v/vt,
+    v//vn or v/vt/vn corners, negative (relative) indices and any number
+    of sides; polygons are fan-triangulated.
+
+    Lines are classified and sliced with whole-buffer array operations, the
+    numbers themselves are parsed by NumPy in C.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    vertices, triangles = parseChunk(data)
+    vertexCount = len(vertices)
+
+    if len(triangles) and (triangles.min() < 0 or triangles.max() >= vertexCount):
+        raise ValueError("OBJ face references a vertex that does not exist")
+
+    return (np.ascontiguousarray(vertices.reshape(-1)),
+            np.ascontiguousarray(triangles.reshape(-1), dtype=np.uint32))
+
+
+def loadObj(path):
+    """Read and parse an OBJ file, see parseObj."""
+    with open(path, 'rb') as f:
+        return parseObj(f.read())
@@ -0,0 +1,122 @@
+"""Streaming OBJ import: a memory-mapped file parsed in fixed-size chunks"""
+
+import mmap
+import os
+
+import numpy as np
+
+from objParser import parseChunk, recordEnd
+
+# Bytes of OBJ text parsed at a time, rounded up to the next line end
+CHUNK_SIZE = 64 << 20
+
+# Rough record sizes, used to preallocate the outputs from the file size
+_BYTES_PER_VERTEX = 32
+_BYTES_PER_TRIANGLE = 24
+
+
+class GrowableArray:
+    """Rows appended to a preallocated array that doubles its capacity when full.
+
+    view() returns the filled rows without copying; that view stays valid
+    until the next append that has to grow.
+    """
+
+    def __init__(self, columns, dtype, capacity=1024):
+        self.data = np.empty((max(capacity, 1), columns), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, rows):
+        """Copy `rows` in at the end and return their (start, stop) row range."""
+        start, stop = self.size, self.size + len(rows)
+        if stop > len(self.data):
+            grown = np.empty((max(stop, 2 * len(self.data)), self.data.shape[1]), dtype=self.data.dtype)
+            grown[:start] = self.data[:start]
+            self.data = grown
+        self.data[start:stop] = rows
+        self.size = stop
+        return start, stop
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class ObjChunk:
+    """Rows added by one parsed chunk and how far through the file parsing is."""
+
+    __slots__ = ('vertexStart', 'vertexStop', 'triangleStart', 'triangleStop', 'bytesRead', 'totalBytes')
+
+    def __init__(self, vertexStart, vertexStop, triangleStart, triangleStop, bytesRead, totalBytes):
+        self.vertexStart = vertexStart
+        self.vertexStop = vertexStop
+        self.triangleStart = triangleStart
+        self.triangleStop = triangleStop
+        self.bytesRead = bytesRead
+        self.totalBytes = totalBytes
+
+    @property
+    def progress(self):
+        return self.bytesRead / self.totalBytes if self.totalBytes else 1.0
+
+
+class ObjStream:
+    """Parses an OBJ file into growing vertex and triangle arrays, one chunk per iteration.
+
+    The file is memory-mapped and only one chunk of about `chunkSize`
+    bytes is copied out and parsed at a time, so peak memory is the
+    outputs plus one chunk rather than several times the file size.
+    Iterating yields an ObjChunk after each chunk; the rows it names in
+    `vertices` and `triangles` are final, so they can be uploaded while
+    parsing continues. Faces must only use vertices defined before them,
+    as the OBJ format requires.
+
+    Capacities default to an estimate from the file size, the arrays grow
+    if it was too low.
+    """
+
+    def __init__(self, path, chunkSize=CHUNK_SIZE, vertexCapacity=None, triangleCapacity=None):
+        self.path = path
+        self.chunkSize = chunkSize
+        self.totalBytes = os.path.getsize(path)
+        if vertexCapacity is None:
+            vertexCapacity = self.totalBytes // (2 * _BYTES_PER_VERTEX)
+        if triangleCapacity is None:
+            triangleCapacity = self.totalBytes // (2 * _BYTES_PER_TRIANGLE)
+        self.vertices = GrowableArray(3, np.float32, vertexCapacity)
+        self.triangles = GrowableArray(3, np.uint32, triangleCapacity)
+        self.bytesRead = 0
+
+    def __iter__(self):
+        if self.totalBytes == 0:
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            while self.bytesRead < self.totalBytes:
+                start = self.bytesRead
+                end = recordEnd(mapped, min(start + self.chunkSize, self.totalBytes) - 1, self.totalBytes)
+                vertices, triangles = parseChunk(mapped[start:end], len(self.vertices))
+
+                vertexStart, vertexStop = self.vertices.append(vertices)
+                if len(triangles) and (triangles.min() < 0 or triangles.max() >= vertexStop):
+                    raise ValueError("OBJ face references a vertex that does not exist")
+                triangleStart, triangleStop = self.triangles.append(triangles)
+                self.bytesRead = end
+                yield ObjChunk(vertexStart, vertexStop, triangleStart, triangleStop, end, self.totalBytes)
+
+    def read(self, progress=None):
+        """Parse the rest of the file and return flat (vertices, triangles) like loadObj.
+
+        `progress`, if given, is called with the fraction of the file
+        parsed after every chunk.
+        """
+        for chunk in self:
+            if progress is not None:
+                progress(chunk.progress)
+        return self.vertices.view().reshape(-1), self.triangles.view().reshape(-1)
+
+
+def streamObj(path, progress=None, chunkSize=CHUNK_SIZE):
+    """Load an OBJ file chunk by chunk, see ObjStream; same result as objParser.loadObj."""
+    return ObjStream(path, chunkSize).read(progress)
@@ -0,0 +1,263 @@
+"""Render saved scenes without a window, display server or GPU
+
+The GL binding is picked by PyOpenGL from PYOPENGL_PLATFORM when OpenGL is
+first imported: 'egl' (the default here) runs surfaceless on any EGL driver,
+including Mesa's llvmpipe, and 'osmesa' uses Mesa's off-screen library.
+
+    python offscreenRenderer.py cache --size 320x240 --out thumbs
+"""
+
+import argparse
+import ctypes
+import os
+import struct
+import sys
+import time
+import zlib
+
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+
+import numpy as np
+from OpenGL import arrays
+from OpenGL.GL import *
+from sceneRenderer import SceneRenderer, meshRegistry, DIRTY_SCENE, DIRTY_CAMERA
+from scenePersistence import ScenePersistence
+from sceneStore import SceneStore
+
+PLATFORM = os.environ['PYOPENGL_PLATFORM']
+
+
+class _EglContext:
+    """GL 3.3 compatibility context without any surface, we draw into our own FBO."""
+
+    def __init__(self):
+        from OpenGL import EGL
+        self.EGL = EGL
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = ctypes.c_long(), ctypes.c_long()
+        if not EGL.eglInitialize(self.display, major, minor):
+            raise RuntimeError('eglInitialize failed')
+
+        configAttributes = arrays.GLintArray.asArray([
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_NONE,
+        ])
+        configs = (EGL.EGLConfig * 1)()
+        numConfigs = ctypes.c_long()
+        if not EGL.eglChooseConfig(self.display, configAttributes, configs, 1, numConfigs) or numConfigs.value == 0:
+            raise RuntimeError('no EGL config with desktop OpenGL support')
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        # The shaders use the compatibility-only attribute/varying keywords
+        contextAttributes = arrays.GLintArray.asArray([
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+            EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_COMPATIBILITY_PROFILE_BIT,
+            EGL.EGL_NONE,
+        ])
+        self.context = EGL.eglCreateContext(self.display, configs[0], EGL.EGL_NO_CONTEXT, contextAttributes)
+        if self.context == EGL.EGL_NO_CONTEXT:
+            raise RuntimeError('eglCreateContext failed')
+
+    def make_current(self):
+        EGL = self.EGL
+        if not EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.context):
+            raise RuntimeError('eglMakeCurrent failed')
+
+    def destroy(self):
+        EGL = self.EGL
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
+
+
+class _OsMesaContext:
+    """GL 3.3 compatibility context rendered by Mesa on the CPU."""
+
+    def __init__(self):
+        from OpenGL import osmesa
+        self.osmesa = osmesa
+        attributes = arrays.GLintArray.asArray([
+            osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+            osmesa.OSMESA_DEPTH_BITS, 24,
+            osmesa.OSMESA_PROFILE, osmesa.OSMESA_COMPAT_PROFILE,
+            osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+            osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+            0,
+        ])
+        self.context = osmesa.OSMesaCreateContextAttribs(attributes, None)
+        if not self.context:
+            raise RuntimeError('OSMesaCreateContextAttribs failed')
+        # OSMesa needs a default framebuffer, frames go to the FBO so 1x1 will do
+        self.buffer = arrays.GLubyteArray.zeros((1, 1, 4))
+
+    def make_current(self):
+        if not self.osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL_UNSIGNED_BYTE, 1, 1):
+            raise RuntimeError('OSMesaMakeCurrent failed')
+
+    def destroy(self):
+        self.osmesa.OSMesaDestroyContext(self.context)
+
+
+def createFramebuffer(width, height):
+    """Return (fbo, color, depth) for an RGBA8 framebuffer with a 24-bit depth buffer."""
+    fbo = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+    color, depth = glGenRenderbuffers(2)
+    glBindRenderbuffer(GL_RENDERBUFFER, color)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, color)
+    glBindRenderbuffer(GL_RENDERBUFFER, depth)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, depth)
+    glBindRenderbuffer(GL_RENDERBUFFER, 0)
+    status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+    if status != GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError(f'framebuffer incomplete: 0x{status:x}')
+    return fbo, color, depth
+
+
+def deleteFramebuffer(framebuffer):
+    fbo, color, depth = framebuffer
+    glBindFramebuffer(GL_FRAMEBUFFER, 0)
+    glDeleteFramebuffers(1, [fbo])
+    glDeleteRenderbuffers(2, [color, depth])
+
+
+def loadScene(path='cache'):
+    """Read a scene saved by the app into a new SceneStore.
+
+    Meshes imported from files are registered under their path, as the app
+    does on startup. The scene files are only read, never written.
+    """
+    store = SceneStore()
+    for state in ScenePersistence(path).read():
+        obj = store.append_state(state)
+        if obj.get_geometry() not in meshRegistry and os.path.isfile(obj.get_geometry()):
+            meshRegistry.register_file(obj.get_geometry())
+    return store
+
+
+def savePng(path, pixels):
+    """Write a (height, width, 4) uint8 array as an RGBA PNG."""
+    height, width = pixels.shape[:2]
+    # Every scanline starts with filter type 0
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data +
+                struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(rows.tobytes())))
+        f.write(chunk(b'IEND', b''))
+
+
+class OffscreenRenderer:
+    """Draws scenes with the same SceneRenderer as GLWidget into an FBO.
+
+    The context is created for PLATFORM, which is fixed once OpenGL has
+    been imported, so create renderers in their own process rather than
+    next to a GLWidget.
+    """
+
+    def __init__(self, width=256, height=256):
+        self.context = _OsMesaContext() if PLATFORM == 'osmesa' else _EglContext()
+        self.context.make_current()
+        self.renderer = SceneRenderer()
+        self.renderer.initialize()
+        self.framebuffer = None
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        self.context.make_current()
+        if self.framebuffer is not None:
+            deleteFramebuffer(self.framebuffer)
+        self.framebuffer = createFramebuffer(width, height)
+        self.width = width
+        self.height = height
+        self.pixels = np.empty((height, width, 4), dtype=np.uint8)
+        self.renderer.resize(width, height)
+
+    def render(self, store=None, camPosition=None, camRotation=None):
+        """Draw a frame and return it as a (height, width, 4) uint8 RGBA array, top row first.
+
+        Without arguments the previous scene and camera are drawn again.
+        """
+        renderer = self.renderer
+        self.context.make_current()
+        if store is not None:
+            renderer.set_scene(store)
+        if camPosition is not None:
+            renderer.camPosition[:] = camPosition
+            renderer.dirty |= DIRTY_CAMERA
+        if camRotation is not None:
+            renderer.camRotation[:] = camRotation
+            renderer.dirty |= DIRTY_CAMERA
+
+        renderer.profiler.begin_frame()
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer[0])
+        renderer.paint()
+        # Blocks until the frame is finished, so timing render() times the GPU too
+        with renderer.profiler.scope('readback'):
+            glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, self.pixels)
+        renderer.profiler.end_frame()
+        return self.pixels[::-1].copy()
+
+    def close(self):
+        self.context.make_current()
+        self.renderer.free()
+        deleteFramebuffer(self.framebuffer)
+        self.context.destroy()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Render saved scenes to PNG thumbnails.')
+    parser.add_argument('scenes', nargs='+', help='scene cache files written by the app')
+    parser.add_argument('--size', default='256x256', help='WIDTHxHEIGHT, default 256x256')
+    parser.add_argument('--out', default='.', help='directory for the PNG files')
+    parser.add_argument('--frames', type=int, default=0,
+                        help='also time this many full redraws per scene')
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    os.makedirs(args.out, exist_ok=True)
+    offscreen = OffscreenRenderer(width, height)
+    try:
+        for path in args.scenes:
+            pixels = offscreen.render(loadScene(path))
+            outPath = os.path.join(args.out, os.path.basename(path) + '.png')
+            savePng(outPath, pixels)
+            print(outPath)
+
+            if args.frames > 0:
+                profiler = offscreen.renderer.profiler
+                profiler.set_enabled(True)
+                start = time.perf_counter()
+                for _ in range(args.frames):
+                    offscreen.renderer.dirty |= DIRTY_SCENE
+                    offscreen.render()
+                elapsed = time.perf_counter() - start
+                print(f'{path}: {offscreen.renderer.objectsDrawn} drawn, '
+                      f'{offscreen.renderer.objectsCulled} culled, '
+                      f'{1000 * elapsed / args.frames:.2f} ms/frame')
+                profiler.collect_gpu(block=True)
+                print(profiler.report())
+                print(offscreen.renderer.meshCache.report())
+                print(meshRegistry.report())
+                profiler.set_enabled(False)
+                profiler.clear()
+    finally:
+        offscreen.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
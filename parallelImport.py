@@ -0,0 +1,198 @@
+"""Process pool OBJ import: large files split across workers, batches of files fanned out"""
+
+import mmap
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from objParser import parseChunk, recordEnd
+
+# Files are parsed in pieces of about this many bytes, split at line ends
+PIECE_SIZE = 64 << 20
+
+# Relative face indices are resolved against this fake vertex count, so the
+# parent can tell them apart from absolute ones and move them to the real
+# count once every earlier piece is known
+_RELATIVE_BASE = 1 << 40
+
+
+def _share(array):
+    """Copy `array` into a new shared memory block and return its (name, shape, dtype)."""
+    if array.nbytes == 0:
+        return None, array.shape, array.dtype.str
+    block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    block.close()
+    return block.name, array.shape, array.dtype.str
+
+
+def _receive(shared):
+    """Copy a shared array out of its block and free the block."""
+    name, shape, dtype = shared
+    if name is None:
+        return np.zeros(shape, dtype=dtype)
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf).copy()
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _parsePiece(path, start, end):
+    """Worker: parse bytes [start, end) of an OBJ file, which begin and end at line boundaries."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        vertices, triangles = parseChunk(mapped[start:end], _RELATIVE_BASE)
+    return _share(vertices), _share(triangles)
+
+
+def splitLines(path, pieceSize=PIECE_SIZE):
+    """Byte ranges of about `pieceSize` covering the file, each ending after a line feed."""
+    size = os.path.getsize(path)
+    if size <= pieceSize:
+        return [(0, size)] if size else []
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        start = 0
+        while start < size:
+            end = recordEnd(mapped, min(start + pieceSize, size) - 1, size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _stitch(pieces):
+    """Join the parsed pieces of one file into flat (vertices, triangles) like loadObj.
+
+    Absolute indices are file-wide already, relative ones are moved from
+    _RELATIVE_BASE to the number of vertices in the pieces before theirs.
+    The outputs are allocated once and filled piece by piece.
+    """
+    vertexCounts = [sharedVertices[1][0] for sharedVertices, _ in pieces]
+    triangleCounts = [sharedTriangles[1][0] for _, sharedTriangles in pieces]
+    vertexCount = sum(vertexCounts)
+    vertices = np.empty((vertexCount, 3), dtype=np.float32)
+    triangles = np.empty((sum(triangleCounts), 3), dtype=np.uint32)
+
+    valid = True
+    vertexBase = triangleBase = 0
+    for (sharedVertices, sharedTriangles), count, triangleCount in zip(pieces, vertexCounts, triangleCounts):
+        # Every block is received, even after an error, so none is left behind
+        vertices[vertexBase:vertexBase + count] = _receive(sharedVertices)
+        tris = _receive(sharedTriangles)
+        relative = tris >= _RELATIVE_BASE // 2
+        tris[relative] += vertexBase - _RELATIVE_BASE
+        if len(tris) and (tris.min() < 0 or tris.max() >= vertexCount):
+            valid = False
+        else:
+            triangles[triangleBase:triangleBase + triangleCount] = tris
+        vertexBase += count
+        triangleBase += triangleCount
+    if not valid:
+        raise ValueError("OBJ face references a vertex that does not exist")
+    return vertices.reshape(-1), triangles.reshape(-1)
+
+
+class ObjImportPool:
+    """Parses OBJ files in a pool of `workers` processes, all CPUs by default.
+
+    Every file is cut at line boundaries into pieces of about `pieceSize`
+    bytes, so one huge file keeps every worker busy and a batch of small
+    files is spread one file per task. Workers hand back their arrays in
+    shared memory blocks, which the parent copies out and frees, instead
+    of pickling them through the result pipe.
+
+    Workers are spawned on first use rather than forked, the parent may be
+    running Qt and GL threads. Call close() when done.
+    """
+
+    def __init__(self, workers=None, pieceSize=PIECE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.pieceSize = pieceSize
+        self.executor = None
+        # Files may be imported from several threads at once
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def _submit(self, path):
+        executor = self._executor()
+        return [executor.submit(_parsePiece, path, start, end)
+                for start, end in splitLines(path, self.pieceSize)]
+
+    def call(self, function, *args):
+        """Run a module-level `function` in a worker and return its result, e.g. to build LODs."""
+        try:
+            return self._executor().submit(function, *args).result()
+        except BrokenProcessPool:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            raise
+
+    def _collect(self, futures):
+        """Wait for the pieces of one file; on failure free every block that did arrive."""
+        pieces, error = [], None
+        for future in futures:
+            try:
+                pieces.append(future.result())
+            except Exception as e:
+                error = error or e
+        if isinstance(error, BrokenProcessPool) and self.executor is not None:
+            # A worker died, start a fresh pool for the next file
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        if error is not None:
+            for piece in pieces:
+                for shared in piece:
+                    _receive(shared)
+            raise error
+        return _stitch(pieces)
+
+    def load(self, path):
+        """Parse one file, returning flat (vertices, triangles) like objParser.loadObj."""
+        return self._collect(self._submit(path))
+
+    def load_many(self, paths):
+        """Parse several files at once; returns one result per path, in order.
+
+        A file that failed to parse has its exception in place of the
+        (vertices, triangles) pair, so one bad file does not lose the rest
+        of a batch.
+        """
+        pending = []
+        for path in paths:
+            try:
+                pending.append(self._submit(path))
+            except (OSError, BrokenProcessPool) as e:
+                pending.append(e)
+        results = []
+        for futures in pending:
+            if isinstance(futures, Exception):
+                results.append(futures)
+                continue
+            try:
+                results.append(self._collect(futures))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,113 @@
+"""Mouse picking: screen rays against an object BVH and per-mesh triangle BVHs"""
+
+import numpy as np
+from glmatrix import mat4_create, mat4_multiply, mat4_invert, mat4_invert_batch
+from bvh import BVH, MeshBVH
+from culling import transformSpheres
+
+
+def screenRay(x, y, width, height, matView, matProjection):
+    """World-space (origin, unit direction) of the ray through a pixel.
+
+    (x, y) are widget coordinates with y pointing down. The ray starts on
+    the near plane.
+    """
+    matViewProjection = mat4_multiply(mat4_create(), matProjection, matView)
+    inverse = np.asarray(mat4_invert(mat4_create(), matViewProjection)).reshape(4, 4).T
+    ndcX = 2.0 * (x + 0.5) / width - 1.0
+    ndcY = 1.0 - 2.0 * (y + 0.5) / height
+    near = inverse @ [ndcX, ndcY, -1.0, 1.0]
+    far = inverse @ [ndcX, ndcY, 1.0, 1.0]
+    origin = near[:3] / near[3]
+    direction = far[:3] / far[3] - origin
+    return origin, direction / np.linalg.norm(direction)
+
+
+class ScenePicker:
+    """Finds the scene object hit first by a ray.
+
+    A BVH over the world-space boxes of the objects' bounding spheres
+    narrows the search. It listens to the SceneStore: an object whose
+    attributes change is refit in place, while adding or removing objects
+    rebuilds it on the next pick. Candidates are then tested exactly,
+    nearest box first, against a triangle BVH of their mesh, built on first
+    use and kept per geometry id.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.store = None
+        self.objectBvh = None
+        self.meshBvhs = {}
+
+    def set_store(self, store):
+        if store is self.store:
+            return
+        if self.store is not None:
+            self.store.listeners.remove(self._store_changed)
+        self.store = store
+        store.listeners.append(self._store_changed)
+        self.objectBvh = None
+
+    def _store_changed(self, kind, row):
+        if kind == 'rename':
+            return
+        if kind == 'update' and self.objectBvh is not None:
+            boxMin, boxMax = self._object_boxes([row])
+            self.objectBvh.refit(row, boxMin[0], boxMax[0])
+        else:
+            self.objectBvh = None
+
+    def _object_boxes(self, rows=slice(None)):
+        store = self.store
+        centers, radii = self.registry.spheres(store.geometryIds, store.columns('geometry')[rows])
+        centers, radii = transformSpheres(store.model_matrices(rows=rows), centers, radii)
+        return centers - radii[:, None], centers + radii[:, None]
+
+    def geometry_changed(self, geometry):
+        """Forget what was built from a mesh that was replaced, e.g. a placeholder that finished loading."""
+        self.meshBvhs.pop(geometry, None)
+        self.objectBvh = None
+
+    def mesh_bvh(self, geometry):
+        bvh = self.meshBvhs.get(geometry)
+        if bvh is None:
+            mesh = self.registry.get(geometry)
+            bvh = self.meshBvhs[geometry] = MeshBVH(mesh.vertices, mesh.triangles)
+        return bvh
+
+    def pick(self, origin, direction):
+        """Return (row, distance) of the nearest object hit by the ray, or None."""
+        store = self.store
+        if store is None or len(store) == 0:
+            return None
+        if self.objectBvh is None:
+            self.objectBvh = BVH(*self._object_boxes())
+
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        rows, entries = self.objectBvh.ray_candidates(origin, direction)
+        if len(rows) == 0:
+            return None
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverses = mat4_invert_batch(None, store.model_matrices(rows=rows)).reshape(-1, 4, 4)
+        best, bestDistance = None, np.inf
+        for row, entry, inverse in zip(rows, entries, inverses):
+            if entry > bestDistance:
+                break
+            # Affine maps keep the ray parameter, so the hit t in mesh space
+            # is the world distance along the unit direction
+            geometry = store.geometryIds[store.geometry[row]]
+            # Meshes still importing have no triangles to hit yet
+            if geometry in self.registry.pending:
+                continue
+            linear = inverse[:3, :3].T
+            distance = self.mesh_bvh(geometry).intersect_ray(
+                linear @ origin + inverse[3, :3], linear @ direction, bestDistance)
+            if distance is not None and distance < bestDistance:
+                best, bestDistance = int(row), distance
+        return None if best is None else (best, bestDistance)
+
+    def pick_screen(self, x, y, width, height, matView, matProjection):
+        return self.pick(*screenRay(x, y, width, height, matView, matProjection))
@@ -0,0 +1,112 @@
+"""Qt item model over a SceneStore, for list views of scene objects"""
+
+from PySide2 import QtCore, QtGui
+from PySide2.QtCore import Qt
+
+# Extra roles: the row's Geometry view and its mesh id
+OBJECT_ROLE = Qt.UserRole
+GEOMETRY_ROLE = Qt.UserRole + 1
+
+
+class SceneListModel(QtCore.QAbstractListModel):
+    """One row per SceneStore row, read straight from the store columns.
+
+    Nothing is copied per object; data() looks the row up when a view
+    asks, so only the rows on screen are ever touched. Store notifications
+    become row insert, remove, move and data-changed signals. The store
+    removes by moving its last row into the hole, which is reported as a
+    removal followed by a move, so selections and current indexes follow
+    the objects rather than the row numbers.
+    """
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = None
+        if store is not None:
+            self.set_store(store)
+
+    def set_store(self, store):
+        if store is self.store:
+            return
+        self.beginResetModel()
+        if self.store is not None:
+            self.store.listeners.remove(self._store_changed)
+        self.store = store
+        if store is not None:
+            store.listeners.append(self._store_changed)
+        self.endResetModel()
+
+    def _store_changed(self, kind, row):
+        if kind == 'append':
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.endInsertRows()
+        elif kind == 'remove':
+            # Sent while the row is still there, as Qt expects
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        elif kind == 'removed':
+            self.endRemoveRows()
+            # Qt shifted the old last row down to `last`, the store moved it
+            # into `row`; right after the removed row they already agree
+            last = len(self.store) - 1
+            if row < last:
+                self.beginMoveRows(QtCore.QModelIndex(), last, last, QtCore.QModelIndex(), row)
+                self.endMoveRows()
+        elif kind == 'bulk':
+            if len(row):
+                # One signal spanning the edited rows
+                self.dataChanged.emit(self.index(int(row.min())), self.index(int(row.max())), [Qt.DecorationRole])
+        elif kind == 'update':
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+        elif kind == 'rename':
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.store is None:
+            return 0
+        return len(self.store)
+
+    def data(self, index, role=Qt.DisplayRole):
+        store = self.store
+        if store is None or not index.isValid() or index.row() >= len(store):
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return store.names[row]
+        if role == Qt.DecorationRole:
+            r, g, b = store.color[row].clip(0, 1).tolist()
+            return QtGui.QColor.fromRgbF(r, g, b)
+        if role in (GEOMETRY_ROLE, Qt.ToolTipRole):
+            return store.geometryIds[store.geometry[row]]
+        if role == OBJECT_ROLE:
+            return store.views[row]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+
+class SceneFilterModel(QtCore.QSortFilterProxyModel):
+    """Case-insensitive search over a SceneListModel by object name or mesh id.
+
+    The proxy only keeps a mapping of the matching rows, the store is not
+    copied. Use set_search() to change the search text.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.search = ''
+
+    def set_search(self, text):
+        self.search = text.strip().lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        if not self.search:
+            return True
+        store = self.sourceModel().store
+        return (self.search in store.names[sourceRow].lower()
+                or self.search in store.geometryIds[store.geometry[sourceRow]].lower())
@@ -0,0 +1,202 @@
+"""Journaled scene persistence written from a background thread"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+DELETED = None
+
+
+class _LegacyObject:
+    """Stand-in for scene objects pickled by older versions, only the attributes are needed."""
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if name == 'Geometry':
+            return _LegacyObject
+        return super().find_class(module, name)
+
+
+class ScenePersistence:
+    """Keeps the scene on disk as a snapshot plus an append-only journal.
+
+    The snapshot (`path`) is a pickled list of per-object state dicts, and
+    the journal (`path` + '.journal') a sequence of pickled (uid, state)
+    records, where a None state deletes the object. Changes are queued by
+    the UI thread and written by a background thread. All changes to one
+    object within `delay` seconds collapse into a single record. Once the
+    journal holds `compactEvery` records it is folded into a new snapshot.
+
+    Objects are identified by a stable uid and kept in insertion order.
+    """
+
+    def __init__(self, path='cache', delay=0.5, compactEvery=1000):
+        self.path = path
+        self.journalPath = path + '.journal'
+        self.delay = delay
+        self.compactEvery = compactEvery
+
+        # Last persisted state per uid, only touched by the writer thread
+        # after load() returned
+        self.states = OrderedDict()
+        self.journalRecords = 0
+
+        self._pending = OrderedDict()
+        self._pendingSince = None
+        self._writing = False
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def load(self):
+        """Recover the scene as a list of state dicts and start the writer."""
+        states = self.read()
+        self._thread = threading.Thread(target=self._run, name='ScenePersistence', daemon=True)
+        self._thread.start()
+        return states
+
+    def read(self):
+        """Recover the scene as a list of state dicts without starting the writer.
+
+        Snapshots written by older versions, a pickled list of Geometry
+        objects, are read through their instance dicts. A torn record at the end of
+        the journal, left by a crash mid-write, is ignored.
+        """
+        self.states.clear()
+        try:
+            with open(self.path, 'rb') as f:
+                for item in _SnapshotUnpickler(f).load():
+                    state = item if isinstance(item, dict) else dict(vars(item))
+                    self.states[state.setdefault('uid', os.urandom(8).hex())] = state
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError) as e:
+            print("Scene snapshot not loaded:", e)
+
+        self.journalRecords = 0
+        try:
+            with open(self.journalPath, 'rb') as f:
+                while True:
+                    try:
+                        uid, state = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        break
+                    self._apply(uid, state)
+                    self.journalRecords += 1
+        except OSError:
+            pass
+        return [dict(state) for state in self.states.values()]
+
+    def put(self, uid, state):
+        """Queue the full new state of an object, a small dict of plain values."""
+        self._queue(uid, state)
+
+    def put_many(self, states):
+        """Queue the new states of many objects at once, keyed by their 'uid'.
+
+        They are taken under one lock and written as one batch.
+        """
+        with self._cond:
+            for state in states:
+                self._pending.pop(state['uid'], None)
+                self._pending[state['uid']] = state
+            if self._pending and self._pendingSince is None:
+                self._pendingSince = time.monotonic()
+                self._cond.notify()
+
+    def delete(self, uid):
+        self._queue(uid, DELETED)
+
+    def flush(self):
+        """Block until everything queued so far is on disk."""
+        if self._thread is None:
+            # No writer running, before load() or after close(): write here
+            with self._cond:
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._pendingSince = None
+            if batch:
+                self._write(batch)
+            return
+        with self._cond:
+            self._pendingSince = 0
+            self._cond.notify()
+            while self._pending or self._writing:
+                self._cond.wait()
+
+    def close(self):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _queue(self, uid, state):
+        with self._cond:
+            # Re-inserting moves the uid to the end, records stay in change order
+            self._pending.pop(uid, None)
+            self._pending[uid] = state
+            if self._pendingSince is None:
+                self._pendingSince = time.monotonic()
+                self._cond.notify()
+
+    def _apply(self, uid, state):
+        if state is DELETED:
+            self.states.pop(uid, None)
+        else:
+            self.states[uid] = state
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._pendingSince is None:
+                        self._cond.wait()
+                        continue
+                    remaining = self._pendingSince + self.delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._pendingSince = None
+                self._writing = True
+                closed = self._closed
+
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+            if closed:
+                return
+
+    def _write(self, batch):
+        try:
+            with open(self.journalPath, 'ab') as f:
+                for uid, state in batch.items():
+                    pickle.dump((uid, state), f, pickle.HIGHEST_PROTOCOL)
+                    self._apply(uid, state)
+                f.flush()
+                os.fsync(f.fileno())
+            self.journalRecords += len(batch)
+            if self.journalRecords >= self.compactEvery:
+                self._compact()
+        except OSError as e:
+            print("Scene save error:", e)
+
+    def _compact(self):
+        """Fold the journal into a fresh snapshot, then start a new journal."""
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            pickle.dump(list(self.states.values()), f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpPath, self.path)
+        # A crash before this point replays the journal onto the new
+        # snapshot, which is harmless because every record is a full state
+        open(self.journalPath, 'wb').close()
+        self.journalRecords = 0
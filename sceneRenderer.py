@@ -0,0 +1,589 @@
+"""Scene drawing shared by GLWidget and the offscreen renderer.
+
+Nothing in here depends on a window, the caller makes a context current
+before calling into SceneRenderer.
+"""
+
+import numpy as np
+from OpenGL.GL import *
+from glmatrix import *
+from meshRegistry import MeshRegistry
+from sceneStore import SceneStore
+from meshCache import (MeshCache, ATTRIB_POSITION, ATTRIB_INSTANCE_COLOR,
+                       ATTRIB_INSTANCE_MODEL, ATTRIB_NORMAL, INSTANCE_FLOATS)
+from vertexLayout import NORMAL_OCTAHEDRAL
+from frameProfiler import FrameProfiler
+from culling import frustumPlanes, transformSpheres, spheresInFrustum
+from picking import ScenePicker
+from frameUniforms import FrameUniforms, FRAME_DATA_BLOCK
+from shaderManager import ShaderManager
+
+# Camera and light state comes from the shared FrameData block. Built with
+# INSTANCED defined, color and model matrix come from per-instance attributes
+# so a whole geometry group is one draw call; otherwise they are per-draw
+# uniforms. Positions may be quantized, uPositionScale and uPositionOffset
+# restore the mesh coordinates, and NORMAL_OCTAHEDRAL selects the normal
+# encoding of the mesh cache, see vertexLayout.
+vertexShaderSource = '''#version 330
+''' + FRAME_DATA_BLOCK + '''in vec4 aVertexPosition;
+#ifdef NORMAL_OCTAHEDRAL
+in vec2 aVertexNormal;
+#else
+in vec3 aVertexNormal;
+#endif
+out vec4 col;
+out vec3 vNormal;
+uniform vec3 uPositionScale;
+uniform vec3 uPositionOffset;
+#ifdef INSTANCED
+in vec4 aInstanceColor;
+in mat4 aInstanceModel;
+#else
+uniform vec4 uColor;
+uniform mat4 uModelMatrix;
+#endif
+
+#ifdef NORMAL_OCTAHEDRAL
+vec3 octDecode(vec2 e) {
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    float t = max(-n.z, 0.0);
+    n.xy += vec2(n.x >= 0.0 ? -t : t, n.y >= 0.0 ? -t : t);
+    return normalize(n);
+}
+#endif
+
+void main() {
+    vec4 position = vec4(aVertexPosition.xyz * uPositionScale + uPositionOffset, 1.0);
+#ifdef NORMAL_OCTAHEDRAL
+    vNormal = octDecode(aVertexNormal);
+#else
+    vNormal = aVertexNormal;
+#endif
+#ifdef INSTANCED
+    col = aInstanceColor;
+    gl_Position = uProjectionMatrix * uViewMatrix * aInstanceModel * position;
+#else
+    col = uColor;
+    gl_Position = uProjectionMatrix * uViewMatrix * uModelMatrix * position;
+#endif
+}
+'''
+
+fragmentShaderSource = '''#version 330
+varying vec4 col;
+
+void main() {
+    gl_FragColor = col;
+}
+'''
+
+# Every variant binds its attributes to the slots the mesh cache VAOs use
+ATTRIB_LOCATIONS = {
+    'aVertexPosition': ATTRIB_POSITION,
+    'aInstanceColor': ATTRIB_INSTANCE_COLOR,
+    'aInstanceModel': ATTRIB_INSTANCE_MODEL,
+    'aVertexNormal': ATTRIB_NORMAL,
+}
+
+# vec3LightPosition = vec3_create()
+# vec3AmbientColor = vec3_create()
+# vec3DiffuseColor = vec3_create()
+# vec3SpecularColor = vec3_create()
+vec3LightPosition = [0, 10, 4];
+vec3AmbientColor = [0.1, 0.1, 0.1];
+vec3DiffuseColor = [0.82, 0.81, 0.8];
+vec3SpecularColor = [0.6, 0.61, 0.62];
+
+matModel = mat4_create()
+
+fFogDensity = 0.001
+
+verticesCube = [
+    0, 0, 1,
+    0, 1, 1,
+    1, 1, 1,
+    1, 0, 1,
+
+    0, 0, 0,
+    0, 1, 0,
+    1, 1, 0,
+    1, 0, 0,
+];
+
+trianglesCube = [
+    0, 1, 2, 0, 2, 3,
+    4, 7, 6, 4, 6, 5,
+    0, 4, 5, 0, 5, 1,
+    3, 2, 6, 3, 6, 7,
+    1, 5, 6, 1, 6, 2,
+    0, 3, 7, 0, 7, 4,
+];
+   
+# Meshes are parsed on first use, files are resolved relative to this package
+meshRegistry = MeshRegistry()
+meshRegistry.register_arrays('cube', verticesCube, trianglesCube)
+meshRegistry.register_file('sphere', 'sphere.obj')
+meshRegistry.register_file('teapot', 'teapot.obj')
+
+position = vec3_create()
+rotation = quat_create()
+scale = vec3_create()
+position = [0, 0, 0]
+quat_identity(rotation)
+scale = [1, 1, 1]
+
+fogOn = 0.001
+
+# Vertical field of view of the camera
+FIELD_OF_VIEW = pi / 2
+
+# Objects at least this many pixels across are drawn at full detail, every
+# halving of the size on screen moves one level coarser
+LOD_BASE_PIXELS = 256
+# How far, in levels, the ideal level must pass a boundary before an object
+# switches, so objects near a boundary do not flicker
+LOD_HYSTERESIS = 0.25
+
+# What a repaint has to refresh, see SceneRenderer.paint
+DIRTY_SCENE = 1
+DIRTY_CAMERA = 2
+DIRTY_VIEWPORT = 4
+DIRTY_LIGHTS = 8
+DIRTY_ALL = DIRTY_SCENE | DIRTY_CAMERA | DIRTY_VIEWPORT | DIRTY_LIGHTS
+
+
+class SceneRenderer:
+    """Draws a SceneStore with the current context.
+
+    State that is expensive to recompute is only refreshed for the `dirty`
+    flags set since the last paint(), the owner ORs in DIRTY_* flags when
+    the scene, camera or viewport change.
+    """
+
+    programData = None
+    program = None
+    instancedProgram = None
+    frameUniforms = None
+
+    # Draw every geometry group with one instanced call when supported,
+    # otherwise fall back to one draw per object
+    instanced = True
+    # Skip objects whose bounding sphere is outside the view frustum
+    culling = True
+    # Draw small or distant objects with simplified meshes
+    lod = True
+
+    canvasWidth = 100
+    canvasHeight = 100
+    # The SceneStore being drawn
+    objectList = None
+    meshCache = None
+
+    def __init__(self):
+        self.objectList = SceneStore()
+        self.camPosition = [0, 1, 4]
+        self.camRotation = quat_create()
+        # Per renderer, so several renderers never share a camera or frustum
+        self.matView = mat4_create()
+        self.matProjection = mat4_create()
+        self.dirty = DIRTY_ALL
+        self.instanceGroups = None
+        # Per-object instance data and world bounding spheres, rebuilt on DIRTY_SCENE
+        self.instances = None
+        self.worldCenters = None
+        self.worldRadii = None
+        # Rows of the store that passed culling, rebuilt on DIRTY_SCENE or DIRTY_CAMERA
+        self.visible = None
+        self.objectsDrawn = 0
+        self.objectsCulled = 0
+        # Level of detail per row and the number of simplified levels of its mesh
+        self.lods = None
+        self.maxLods = None
+        self.picker = ScenePicker(meshRegistry)
+        # Frames are only timed between the owner's begin_frame() and end_frame()
+        self.profiler = FrameProfiler()
+        self.shaders = ShaderManager()
+
+    def set_scene(self, objectList):
+        if objectList is not self.objectList:
+            if self._store_changed in self.objectList.listeners:
+                self.objectList.listeners.remove(self._store_changed)
+            self.lods = None
+        if self._store_changed not in objectList.listeners:
+            objectList.listeners.append(self._store_changed)
+        self.objectList = objectList
+        # Meshes still placed in the scene must survive cache eviction
+        meshRegistry.set_referenced(objectList.geometry_ids_in_use())
+        self.picker.set_store(objectList)
+        self.dirty |= DIRTY_SCENE
+
+    def _store_changed(self, kind, row):
+        # Removal moves the last row into the hole, so row-indexed levels would
+        # go to the wrong objects; forget them and start without hysteresis
+        if kind in ('append', 'remove'):
+            self.lods = None
+
+    def pick(self, x, y, width=None, height=None):
+        """Return (store row, distance) of the object under a pixel of the last frame, or None."""
+        return self.picker.pick_screen(x, y, width or self.canvasWidth, height or self.canvasHeight,
+                                       self.matView, self.matProjection)
+
+    def initialize(self):
+        """Compile the programs and create the mesh cache in the current context."""
+        # Meshes are uploaded on their first draw and reused afterwards
+        self.meshCache = MeshCache(meshRegistry)
+        # Programs must read normals the way the mesh cache stores them
+        defines = ['NORMAL_OCTAHEDRAL'] if self.meshCache.normalEncoding == NORMAL_OCTAHEDRAL else []
+
+        # Variants are compiled once per context, or loaded from the binary cache
+        self.shaders.initialize()
+        program = self.shaders.program(vertexShaderSource, fragmentShaderSource, defines, ATTRIB_LOCATIONS)
+        self.program = program
+
+        # glUseProgram(program)
+        # Setup the uniform locations
+        # Camera, light and fog uniforms live in the FrameData block
+        programData = {};
+        programData['locModelMatrix'] = program.uniform("uModelMatrix");
+
+        programData['uColor'] = program.uniform("uColor");
+
+        # Setup the buffer objects and attributes
+        programData['bufVertexNormal'] = glGenBuffers(1);
+        programData['attribVertexNormal'] = program.attribute("aVertexNormal");
+        programData['bufVertexPosition'] = glGenBuffers(1);
+        programData['attribVertexPosition'] = program.attribute("aVertexPosition");
+
+        programData['posAttr'] = program.attribute('posAttr');
+        programData['colAttr'] = program.attribute('colAttr');
+        programData['matrix'] = program.uniform('matrix');
+
+        # No attribute for triangle buffer
+        programData['bufTriangle'] = glGenBuffers(1);
+        self.programData = programData
+
+        # Shared by every program, bound once and refreshed when the camera,
+        # viewport or lights change
+        self.frameUniforms = FrameUniforms()
+        self.frameUniforms.attach(program.id)
+
+        try:
+            self.instancedProgram = self.shaders.program(vertexShaderSource, fragmentShaderSource,
+                                                         defines + ['INSTANCED'], ATTRIB_LOCATIONS)
+            self.frameUniforms.attach(self.instancedProgram.id)
+        except RuntimeError as e:
+            print("Instanced rendering unavailable:", e)
+            self.instancedProgram = None
+
+        self.profiler.initialize()
+
+    def paint(self):
+        """draw the scene:"""
+        programData = self.programData
+
+        # glClear(GL_COLOR_BUFFER_BIT);
+
+        # glUseProgram(self.program);
+
+        # self.camPosition = [0, 0, 1];
+        # mat4_fromRotationTranslation(matView, self.camRotation, self.camPosition);
+        # mat4_invert(matView, matView);
+
+        # mat4_perspective(matProjection, pi / 2, canvasWidth / canvasHeight, 0.001, 3000);
+        # glUniformMatrix4fv(programData['matrix'], 1, False, matProjection);
+
+        # glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, programData['bufTriangle']);
+        # glBufferData(GL_ELEMENT_ARRAY_BUFFER, castUintArr(triangles), GL_STATIC_DRAW);
+
+        # glVertexAttribPointer(programData['posAttr'], 3, GL_FLOAT, GL_FALSE, 0, vertices);
+        # glVertexAttribPointer(programData['colAttr'], 3, GL_FLOAT, GL_FALSE, 0, colors);
+
+        # glEnableVertexAttribArray(programData['posAttr']);
+        # glEnableVertexAttribArray(programData['colAttr']);
+
+        # glDrawElements(GL_TRIANGLES, 3, GL_UNSIGNED_INT, c_void_p(0));
+
+        # return
+        
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        # glPushMatrix()
+        # self.draw_shape(self.shape1, -1.0, -1.0, 0.0,
+        #     (self.x_shape_rot, self.y_shape_rot, self.z_shape_rot))
+
+        
+        # vec3.transformQuat(camPosition, camPosition, self.camRotation);
+
+        # Repaints without flags (e.g. expose events) reuse the cached state
+        dirty = self.dirty
+        self.dirty = 0
+
+        glClearColor(0.5, 0.5, 0.5, 1.0);
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT);
+        glLoadIdentity();
+
+        # glEnable(GL_CULL_FACE);
+        # glCullFace(GL_BACK);
+        # glDisable(GL_CULL_FACE);
+
+        # Camera, light and fog state, uploaded to the FrameData block only when it changed
+        with self.profiler.scope('camera'):
+            frameUniforms = self.frameUniforms
+
+            # View matrix
+            if dirty & DIRTY_CAMERA:
+                mat4_fromRotationTranslation(self.matView, self.camRotation, self.camPosition);
+                mat4_invert(self.matView, self.matView);
+                frameUniforms.set(view=self.matView, cameraPosition=self.camPosition)
+
+            # Projection matrix
+            if dirty & DIRTY_VIEWPORT:
+                mat4_perspective(self.matProjection, FIELD_OF_VIEW, self.canvasWidth / self.canvasHeight, 0.001, 3000);
+                frameUniforms.set(projection=self.matProjection)
+
+            # Light
+            # Since it is not restricted, I use a light that follows the camera
+            #var lightPosition = vec3.clone(vec3LightPosition);
+            #vec3.transformMat4(lightPosition, lightPosition, matSkyView);
+            if dirty & DIRTY_LIGHTS:
+                frameUniforms.set(lightPosition=vec3LightPosition, ambientColor=vec3AmbientColor,
+                                  diffuseColor=vec3DiffuseColor, specularColor=vec3SpecularColor,
+                                  fogDensity=fFogDensity)
+
+            frameUniforms.upload()
+
+        if dirty & DIRTY_SCENE or self.instances is None:
+            with self.profiler.scope('transforms'):
+                self.update_instances()
+        visibilityChanged = dirty or self.visible is None
+        if visibilityChanged:
+            with self.profiler.scope('culling'):
+                self.update_visibility()
+            with self.profiler.scope('lod'):
+                self.update_lods()
+
+        if self.instanced and self.instancedProgram is not None:
+            self.draw_instanced(visibilityChanged)
+        else:
+            self.draw_per_object()
+        glBindVertexArray(0)
+
+        # Vertex normals
+        # glBindBuffer(GL_ARRAY_BUFFER, programData['bufVertexNormal']);
+        # glBufferData(GL_ARRAY_BUFFER, castFloatArr(normals), GL_DYNAMIC_DRAW);
+        # glVertexAttribPointer(programData['attribVertexNormal'], 3, GL_FLOAT, False, 3 *  sizeof(c_float), 0);
+        # glEnableVertexAttribArray(programData['attribVertexNormal']);
+
+        # Vertex vertices
+        # glVertexAttribPointer(programData['attribVertexPosition'], 3, GL_FLOAT, GL_FALSE, 0, verticesSphere);
+        # glEnableVertexAttribArray(programData['attribVertexPosition']);
+
+        # # Triangles
+        # glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, programData['bufTriangle']);
+        # glBufferData(GL_ELEMENT_ARRAY_BUFFER, castUintArr(trianglesSphere), GL_STATIC_DRAW);
+        # glDrawElements(GL_TRIANGLES, len(trianglesSphere), GL_UNSIGNED_INT, c_void_p(0));
+
+        # mat4_fromRotationTranslationScale(matModel, rotation, [2, 0, 0], scale);
+        # glUniformMatrix4fv(programData['locModelMatrix'], 1, False, matModel);
+        # glDrawElements(GL_TRIANGLES, len(trianglesSphere), GL_UNSIGNED_INT, c_void_p(0));
+
+    def draw_per_object(self):
+        """Fallback path: one model matrix upload and one draw per visible object."""
+        program = self.program
+        program.use()
+        programData = self.programData
+        profiler = self.profiler
+        store = self.objectList
+        rows = self.visible.tolist()
+        keys = list(zip(store.columns('geometry')[self.visible].tolist(), self.lods[self.visible].tolist()))
+        # Each phase is timed once per frame, a GPU query per object would cost more than the draws.
+        # Meshes are looked up once per distinct mesh and level, uploading the missing ones
+        with profiler.scope('uploads'):
+            meshes = {key: self.meshCache.get(store.geometryIds[key[0]], key[1]) for key in set(keys)}
+        with profiler.scope('draws'):
+            for row, key in zip(rows, keys):
+                mesh = meshes[key]
+                if mesh is not None:
+                    glUniform4fv(programData['uColor'], 1, self.instances[row, :4]);
+                    glUniformMatrix4fv(programData['locModelMatrix'], 1, False, self.instances[row, 4:]);
+                    glUniform3fv(program.uniform('uPositionScale'), 1, mesh.positionScale)
+                    glUniform3fv(program.uniform('uPositionOffset'), 1, mesh.positionOffset)
+                    mesh.draw()
+            self.draw_placeholders()
+
+    def draw_instanced(self, changed=True):
+        """Draw all visible objects sharing a geometry and level of detail with a single instanced call.
+
+        Instance buffers are only rebuilt when the scene or the set of
+        visible objects changed.
+        """
+        program = self.instancedProgram
+        program.use()
+
+        profiler = self.profiler
+        if changed or self.instanceGroups is None:
+            with profiler.scope('transforms'):
+                self.instanceGroups = self.build_instance_groups()
+
+        meshes = []
+        # Each phase is timed once per frame, not once per group
+        with profiler.scope('uploads'):
+            for geometry, lod, instances in self.instanceGroups:
+                mesh = self.meshCache.get(geometry, lod)
+                # A mesh re-uploaded after eviction has lost its instance data
+                if mesh is not None and (changed or mesh.instanceCount != len(instances)):
+                    mesh.upload_instances(instances)
+                meshes.append(mesh)
+        with profiler.scope('draws'):
+            for mesh in meshes:
+                if mesh is not None:
+                    glUniform3fv(program.uniform('uPositionScale'), 1, mesh.positionScale)
+                    glUniform3fv(program.uniform('uPositionOffset'), 1, mesh.positionOffset)
+                    mesh.draw_instanced()
+            self.draw_placeholders()
+
+    def draw_placeholders(self):
+        """Draw objects whose mesh is still importing as what was read so far.
+
+        That is the mesh cache's stream of the mesh if it has one, which
+        has positions but no normals, and otherwise a wire box around the
+        vertices read. Runs inside the caller's 'draws' scope.
+        """
+        streams = self.meshCache.streams
+        if not meshRegistry.pending and not streams:
+            return
+        store = self.objectList
+        pending = [code for code, name in enumerate(store.geometryIds)
+                   if name in meshRegistry.pending or name in streams]
+        rows = self.visible[np.isin(store.columns('geometry')[self.visible], pending)]
+        if not len(rows):
+            return
+        box = self.meshCache.placeholder_box()
+        program = self.program
+        program.use()
+        programData = self.programData
+        for row in rows:
+            name = store.geometryIds[store.geometry[row]]
+            glUniform4fv(programData['uColor'], 1, self.instances[row, :4]);
+            glUniformMatrix4fv(programData['locModelMatrix'], 1, False, self.instances[row, 4:]);
+            stream = streams.get(name)
+            if stream is not None:
+                glUniform3fv(program.uniform('uPositionScale'), 1, stream.positionScale)
+                glUniform3fv(program.uniform('uPositionOffset'), 1, stream.positionOffset)
+                stream.draw()
+                continue
+            low, high = meshRegistry.pending[name]
+            # The box mesh spans [-1, 1], the dequantization uniforms fit it to the bounds
+            glUniform3fv(program.uniform('uPositionScale'), 1, ((high - low) / 2).astype(np.float32))
+            glUniform3fv(program.uniform('uPositionOffset'), 1, ((high + low) / 2).astype(np.float32))
+            box.draw()
+
+    def update_instances(self):
+        """Build instance data and world bounding spheres for every object in the store."""
+        store = self.objectList
+        count = len(store)
+        instances = np.empty((count, INSTANCE_FLOATS), dtype=np.float32)
+        self.instances = instances
+        if count == 0:
+            self.worldCenters = np.zeros((0, 3))
+            self.worldRadii = np.zeros(0)
+            self.maxLods = np.zeros(0, dtype=np.int64)
+            return
+
+        # Instance data for every object, built straight from the store columns
+        instances[:, :3] = store.columns('color')
+        instances[:, 3] = 1.0
+        store.model_matrices(instances[:, 4:])
+
+        # Unknown meshes get a NaN radius, which never passes the frustum test
+        centers, radii = meshRegistry.spheres(store.geometryIds, store.columns('geometry'))
+        self.worldCenters, self.worldRadii = transformSpheres(instances[:, 4:], centers, radii)
+        self.maxLods = meshRegistry.lod_counts(store.geometryIds, store.columns('geometry'))
+
+    def update_visibility(self):
+        """Test every object against the view frustum in one pass."""
+        count = len(self.instances)
+        if self.culling and count:
+            matViewProjection = mat4_multiply(mat4_create(), self.matProjection, self.matView)
+            inside = spheresInFrustum(frustumPlanes(matViewProjection), self.worldCenters, self.worldRadii)
+            self.visible = np.flatnonzero(inside)
+        else:
+            self.visible = np.arange(count)
+        self.objectsDrawn = len(self.visible)
+        self.objectsCulled = count - self.objectsDrawn
+
+    def update_lods(self):
+        """Pick each object's level of detail from the size of its bounding sphere on screen.
+
+        An object keeps its previous level until the ideal level has moved
+        LOD_HYSTERESIS past the boundary of that level.
+        """
+        count = len(self.instances)
+        if not self.lod or count == 0:
+            self.lods = np.zeros(count, dtype=np.int64)
+            return
+
+        distances = np.linalg.norm(self.worldCenters - np.asarray(self.camPosition), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pixels = self.worldRadii / (distances * tan(FIELD_OF_VIEW / 2)) * self.canvasHeight
+            ideal = np.log2(LOD_BASE_PIXELS / pixels)
+        ideal = np.nan_to_num(ideal, nan=0.0, posinf=np.inf, neginf=0.0)
+        lods = np.clip(np.floor(ideal), 0, self.maxLods).astype(np.int64)
+
+        previous = self.lods
+        if previous is not None and len(previous) == count:
+            keep = ((ideal >= previous - LOD_HYSTERESIS) & (ideal < previous + 1 + LOD_HYSTERESIS) &
+                    (previous <= self.maxLods))
+            lods = np.where(keep, previous, lods)
+        self.lods = lods
+
+    def build_instance_groups(self):
+        """Return (geometry id, level of detail, instance data) triples for the visible objects."""
+        store = self.objectList
+        visible = self.visible
+        if len(visible) == 0:
+            return []
+
+        # Rows sorted by geometry and level, each run of equal keys is one draw
+        codes = store.columns('geometry')
+        order = visible[np.lexsort((self.lods[visible], codes[visible]))]
+        sortedCodes = codes[order]
+        sortedLods = self.lods[order]
+        changes = (np.diff(sortedCodes) != 0) | (np.diff(sortedLods) != 0)
+        bounds = np.concatenate(([0], np.flatnonzero(changes) + 1, [len(order)]))
+        return [(store.geometryIds[sortedCodes[start]], int(sortedLods[start]), self.instances[order[start:end]])
+                for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def geometry_changed(self, name):
+        """A mesh was loaded in the background or its placeholder grew, rebuild what depends on it."""
+        self.picker.geometry_changed(name)
+        if self.meshCache is not None:
+            self.meshCache.end_stream(name)
+        self.dirty |= DIRTY_SCENE
+
+    def set_instanced(self, enabled):
+        self.instanced = enabled
+        self.dirty |= DIRTY_SCENE
+
+    def set_culling(self, enabled):
+        self.culling = enabled
+        self.dirty |= DIRTY_SCENE
+
+    def set_lod(self, enabled):
+        self.lod = enabled
+        self.dirty |= DIRTY_SCENE
+
+    def resize(self, width, height):
+        glViewport(0, 0, width, height)
+        self.canvasWidth = width
+        self.canvasHeight = height
+        self.dirty |= DIRTY_VIEWPORT
+
+    def free(self):
+        self.profiler.free()
+        self.shaders.free()
+        if self.frameUniforms is not None:
+            self.frameUniforms.free()
+            self.frameUniforms = None
+        if self.meshCache is not None:
+            self.meshCache.free()
+            self.meshCache = None
@@ -0,0 +1,255 @@
+"""Struct-of-arrays storage for scene objects"""
+
+import os
+
+import numpy as np
+from glmatrix import quat_fromEuler_batch, mat4_fromRotationTranslationScale_batch
+
+# Per-object float32 (x, y, z) columns and the value a new object starts with
+VECTOR_COLUMNS = {
+    'position': (0.0, 0.0, 0.0),
+    'color': (0.0, 0.0, 1.0),
+    'scale': (1.0, 1.0, 1.0),
+    'rotation': (0.0, 0.0, 0.0),
+    'translation': (0.0, 0.0, 0.0),
+}
+
+
+class SceneStore:
+    """All scene objects as contiguous NumPy columns, one row per object.
+
+    `position`, `color`, `scale`, `rotation` and `translation` are float32
+    (capacity, 3) arrays and `geometry` an int32 column indexing the
+    `geometryIds` table of mesh ids. Only the first `count` rows are live,
+    `columns(name)` returns that slice. Appends are amortized O(1), and
+    removal moves the last row into the hole, so row order is not stable;
+    use the Geometry views or uids to keep track of objects.
+    """
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.capacity = 0
+        self.geometry = np.zeros(0, dtype=np.int32)
+        for name in VECTOR_COLUMNS:
+            setattr(self, name, np.zeros((0, 3), dtype=np.float32))
+        self.geometryIds = []
+        self._geometryIndex = {}
+        self.names = []
+        self.uids = []
+        self.views = []
+        # Called as listener(kind, row) with kind 'append', 'update',
+        # 'rename', 'remove' or 'removed'; 'remove' is sent before the last
+        # row moves into the hole and 'removed' after. Bulk edits send one
+        # 'bulk' with an array of rows instead
+        self.listeners = []
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.views)
+
+    def columns(self, name):
+        return getattr(self, name)[:self.count]
+
+    def geometry_code(self, geometryId):
+        """Index of a mesh id in `geometryIds`, adding it on first use."""
+        code = self._geometryIndex.get(geometryId)
+        if code is None:
+            code = len(self.geometryIds)
+            self.geometryIds.append(geometryId)
+            self._geometryIndex[geometryId] = code
+        return code
+
+    def notify(self, kind, row):
+        for listener in self.listeners:
+            listener(kind, row)
+
+    def model_matrices(self, out=None, rows=slice(None)):
+        """Flat column-major model matrices of the live rows (or `rows`), shape (n, 16)."""
+        count = self.count
+        rotations = quat_fromEuler_batch(None, self.rotation[:count][rows])
+        return mat4_fromRotationTranslationScale_batch(out, rotations,
+                                                       self.translation[:count][rows],
+                                                       self.scale[:count][rows])
+
+    def geometry_ids_in_use(self):
+        codes = np.unique(self.geometry[:self.count])
+        return [self.geometryIds[code] for code in codes]
+
+    def append(self, geometry, name=None, uid=None):
+        """Add an object with default attributes and return its Geometry view."""
+        if self.count == self.capacity:
+            self._grow(max(2 * self.capacity, 64))
+        row = self.count
+        self.count += 1
+        self.geometry[row] = self.geometry_code(geometry)
+        for column, default in VECTOR_COLUMNS.items():
+            getattr(self, column)[row] = default
+        if name is None:
+            name = f'new {os.path.splitext(os.path.basename(geometry))[0]}'
+        self.names.append(name)
+        self.uids.append(uid or os.urandom(8).hex())
+        view = Geometry(self, row)
+        self.views.append(view)
+        self.notify('append', row)
+        return view
+
+    def append_state(self, state):
+        """Add an object from a dict as produced by Geometry.get_state."""
+        view = self.append(state['geometry'], state.get('name'), state.get('uid'))
+        for column in VECTOR_COLUMNS:
+            if column in state:
+                view._set_vector(column, state[column], notify=False)
+        return view
+
+    def remove(self, row):
+        """Swap-remove a row, the removed view is detached from the store."""
+        self.notify('remove', row)
+        last = self.count - 1
+        removed = self.views[row]
+        if row != last:
+            self.geometry[row] = self.geometry[last]
+            for column in VECTOR_COLUMNS:
+                values = getattr(self, column)
+                values[row] = values[last]
+            self.names[row] = self.names[last]
+            self.uids[row] = self.uids[last]
+            self.views[row] = self.views[last]
+            self.views[row].row = row
+        self.names.pop()
+        self.uids.pop()
+        self.views.pop()
+        self.count = last
+        removed.store = None
+        removed.row = -1
+        self.notify('removed', row)
+
+    def set_rows(self, rows, column, values):
+        """Set a vector column of every row in `rows` to `values`, one vector or one per row."""
+        rows = np.asarray(rows, dtype=np.intp)
+        getattr(self, column)[rows] = values
+        self.notify('bulk', rows)
+
+    def offset_rows(self, rows, column, offset):
+        """Add `offset`, one vector or one per row, to a vector column of every row in `rows`."""
+        rows = np.asarray(rows, dtype=np.intp)
+        getattr(self, column)[rows] += np.asarray(offset, dtype=np.float32)
+        self.notify('bulk', rows)
+
+    def scale_rows(self, rows, factors, pivot=None):
+        """Scale every row in `rows` by `factors` about `pivot`, the mean translation by default.
+
+        Both the scale and the distance of each translation from the pivot
+        are multiplied, so the rows grow or shrink as one group.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        factors = np.asarray(factors, dtype=np.float32)
+        translations = self.translation[rows]
+        if pivot is None:
+            pivot = translations.mean(axis=0) if len(rows) else np.zeros(3, np.float32)
+        pivot = np.asarray(pivot, dtype=np.float32)
+        self.translation[rows] = pivot + (translations - pivot) * factors
+        self.scale[rows] *= factors
+        self.notify('bulk', rows)
+
+    def states(self, rows):
+        """Plain copies of `rows` like Geometry.get_state, built column by column."""
+        rows = np.asarray(rows, dtype=np.intp).tolist()
+        columns = {column: getattr(self, column)[rows].tolist() for column in VECTOR_COLUMNS}
+        states = []
+        for i, row in enumerate(rows):
+            state = {'uid': self.uids[row], 'name': self.names[row],
+                     'geometry': self.geometryIds[self.geometry[row]]}
+            for column, values in columns.items():
+                state[column] = values[i]
+            states.append(state)
+        return states
+
+    def _grow(self, capacity):
+        def grown(column):
+            out = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+            out[:self.count] = column[:self.count]
+            return out
+
+        self.geometry = grown(self.geometry)
+        for name in VECTOR_COLUMNS:
+            setattr(self, name, grown(getattr(self, name)))
+        self.capacity = capacity
+
+
+class Geometry:
+    """Lightweight view onto one row of a SceneStore."""
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def uid(self):
+        return self.store.uids[self.row]
+
+    def _get_vector(self, column):
+        return getattr(self.store, column)[self.row].tolist()
+
+    def _set_vector(self, column, values, notify=True):
+        values = list(values)[:3]
+        getattr(self.store, column)[self.row] = values + [0.0] * (3 - len(values))
+        if notify:
+            self.store.notify('update', self.row)
+
+    def get_name(self):
+        return self.store.names[self.row]
+
+    def get_geometry(self):
+        return self.store.geometryIds[self.store.geometry[self.row]]
+
+    def get_color(self):
+        return self._get_vector('color')
+
+    def get_position(self):
+        return self._get_vector('position')
+
+    def get_scale(self):
+        return self._get_vector('scale')
+
+    def get_rotation(self):
+        return self._get_vector('rotation')
+
+    def get_translation(self):
+        return self._get_vector('translation')
+
+    def set_name(self,name):
+        self.store.names[self.row] = name
+        self.store.notify('rename', self.row)
+
+    def set_color(self,color):
+        self._set_vector('color', color)
+
+    def set_position(self,position):
+        self._set_vector('position', position)
+
+    def set_scale(self,scale):
+        self._set_vector('scale', scale)
+
+    def set_rotation(self,rotation):
+        self._set_vector('rotation', rotation)
+
+    def set_translation(self,translation):
+        self._set_vector('translation', translation)
+
+    # The old attribute API, still used by code that reads objects directly
+    name = property(get_name, set_name)
+
+    def get_state(self):
+        """Plain copy of the row, as written by ScenePersistence."""
+        state = {'uid': self.uid, 'name': self.get_name(), 'geometry': self.get_geometry()}
+        for column in VECTOR_COLUMNS:
+            state[column] = self._get_vector(column)
+        return state
+
+    def __repr__(self):
+        return f'{self.get_name()} {self.get_color()}'
@@ -0,0 +1,227 @@
+"""Shader programs built from sources plus defines, with cached locations and on-disk program binaries"""
+
+import hashlib
+import os
+
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.error import GLError, NullFunctionError
+
+SHADER_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SHADER_DIR, '.shadercache')
+
+# Bump when the key or the file layout changes, invalidates every cache file
+CACHE_VERSION = 1
+
+
+def applyDefines(source, defines):
+    """Insert one #define per entry of `defines` right after the #version line."""
+    if not defines:
+        return source
+    lines = ''.join(f'#define {name} {value}\n' for name, value in defines)
+    if source.startswith('#version'):
+        end = source.index('\n') + 1
+        return source[:end] + lines + source[end:]
+    return lines + source
+
+
+def _normalizeDefines(defines):
+    """Sorted (name, value) pairs from a dict or an iterable of flag names."""
+    if not defines:
+        return ()
+    if not isinstance(defines, dict):
+        defines = dict.fromkeys(defines, 1)
+    return tuple(sorted((name, str(value)) for name, value in defines.items()))
+
+
+def _compileShader(kind, source):
+    shader = glCreateShader(kind)
+    glShaderSource(shader, source)
+    glCompileShader(shader)
+    if glGetShaderiv(shader, GL_COMPILE_STATUS) != GL_TRUE:
+        log = glGetShaderInfoLog(shader)
+        glDeleteShader(shader)
+        raise RuntimeError(log)
+    return shader
+
+
+def createProgram(vertexSource, fragmentSource, attribLocations, retrievable=False):
+    """Compile and link a program, binding attributes to fixed slots before linking.
+
+    With `retrievable` the driver is asked to keep the linked binary
+    available to glGetProgramBinary.
+    """
+    vertexShader = _compileShader(GL_VERTEX_SHADER, vertexSource)
+    fragmentShader = _compileShader(GL_FRAGMENT_SHADER, fragmentSource)
+
+    program = glCreateProgram()
+    glAttachShader(program, vertexShader)
+    glAttachShader(program, fragmentShader)
+    for name, location in attribLocations.items():
+        glBindAttribLocation(program, location, name)
+    if retrievable:
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    glLinkProgram(program)
+
+    # The linked program keeps the compiled code
+    glDeleteShader(vertexShader)
+    glDeleteShader(fragmentShader)
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+        log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError(log)
+    return program
+
+
+class ShaderProgram:
+    """A linked program whose uniform and attribute locations are looked up once."""
+
+    def __init__(self, program, fromBinary=False):
+        self.id = program
+        # True when the program was loaded from the disk cache instead of compiled
+        self.fromBinary = fromBinary
+        self.uniforms = {}
+        self.attributes = {}
+
+    def uniform(self, name):
+        location = self.uniforms.get(name)
+        if location is None:
+            location = self.uniforms[name] = glGetUniformLocation(self.id, name)
+        return location
+
+    def attribute(self, name):
+        location = self.attributes.get(name)
+        if location is None:
+            location = self.attributes[name] = glGetAttribLocation(self.id, name)
+        return location
+
+    def use(self):
+        glUseProgram(self.id)
+
+
+class ShaderManager:
+    """Builds shader variants and keeps them for the lifetime of the context.
+
+    A variant is a vertex and fragment source plus a set of defines, which
+    program() inserts after the #version line. Asking twice for the same
+    variant returns the same ShaderProgram.
+
+    When the driver supports program binaries (GL 4.1 or
+    ARB_get_program_binary), linked programs are also written to
+    `cacheDir`, keyed by a hash of the final sources, the attribute slots
+    and the driver vendor, renderer and version strings. Later launches
+    load the binary instead of compiling; a binary the driver rejects,
+    e.g. after a driver update that kept its version string, is deleted
+    and the variant compiled from source. Pass cacheDir=None to always
+    compile.
+    """
+
+    def __init__(self, cacheDir=CACHE_DIR):
+        self.cacheDir = cacheDir
+        self.programs = {}
+        self.driver = ''
+        self.binaries = False
+
+    def initialize(self):
+        """Read the driver string and check binary support, the context must be current."""
+        self.driver = '\n'.join(glGetString(name).decode(errors='replace')
+                                for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+        try:
+            self.binaries = (self.cacheDir is not None and bool(glProgramBinary) and
+                             glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0)
+        except (GLError, NullFunctionError):
+            self.binaries = False
+
+    def program(self, vertexSource, fragmentSource, defines=None, attribLocations=None):
+        """Return the ShaderProgram of a variant, building it on first use.
+
+        `defines` is a dict of name to value, or an iterable of names
+        defined as 1. Raises RuntimeError with the info log when the
+        sources do not compile or link.
+        """
+        defines = _normalizeDefines(defines)
+        attribLocations = attribLocations or {}
+        vertexSource = applyDefines(vertexSource, defines)
+        fragmentSource = applyDefines(fragmentSource, defines)
+
+        digest = hashlib.sha1()
+        for part in (str(CACHE_VERSION), self.driver, vertexSource, fragmentSource,
+                     repr(sorted(attribLocations.items()))):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        key = digest.hexdigest()
+
+        shader = self.programs.get(key)
+        if shader is None:
+            program = self._load_binary(key)
+            if program is not None:
+                shader = ShaderProgram(program, fromBinary=True)
+            else:
+                program = createProgram(vertexSource, fragmentSource, attribLocations, self.binaries)
+                self._store_binary(key, program)
+                shader = ShaderProgram(program)
+            self.programs[key] = shader
+        return shader
+
+    def _cache_path(self, key):
+        return os.path.join(self.cacheDir, f'{key[:24]}.npz')
+
+    def _load_binary(self, key):
+        if not self.binaries:
+            return None
+        cachePath = self._cache_path(key)
+        try:
+            with np.load(cachePath) as cached:
+                if str(cached['key']) != key:
+                    return None
+                binaryFormat = int(cached['format'])
+                binary = np.ascontiguousarray(cached['binary'], dtype=np.uint8)
+        except (OSError, KeyError, ValueError):
+            return None
+
+        program = glCreateProgram()
+        try:
+            glProgramBinary(program, binaryFormat, binary, len(binary))
+            linked = glGetProgramiv(program, GL_LINK_STATUS) == GL_TRUE
+        except GLError:
+            linked = False
+        if not linked:
+            glDeleteProgram(program)
+            try:
+                os.remove(cachePath)
+            except OSError:
+                pass
+            return None
+        return program
+
+    def _store_binary(self, key, program):
+        """Write the linked binary atomically, a failed write only costs a compile next time."""
+        if not self.binaries:
+            return
+        try:
+            length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+            if length <= 0:
+                return
+            binary = np.zeros(length, dtype=np.uint8)
+            written = np.zeros(1, dtype=np.int32)
+            binaryFormat = np.zeros(1, dtype=np.uint32)
+            glGetProgramBinary(program, length, written, binaryFormat, binary)
+        except GLError as e:
+            print("Program binary unavailable:", e)
+            return
+
+        cachePath = self._cache_path(key)
+        try:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            tmpPath = f'{cachePath}.{os.getpid()}.tmp'
+            with open(tmpPath, 'wb') as f:
+                np.savez(f, key=key, format=int(binaryFormat[0]), binary=binary[:int(written[0])])
+            os.replace(tmpPath, cachePath)
+        except OSError as e:
+            print("Shader cache write failed:", e)
+
+    def free(self):
+        """Delete every program, the context must be current."""
+        for shader in self.programs.values():
+            glDeleteProgram(shader.id)
+        self.programs.clear()
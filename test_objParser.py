@@ -0,0 +1,96 @@
+"""objParser against the original line-by-line loader on reformatted OBJ files"""
+
+import os
+
+import numpy as np
+import pytest
+
+from objParser import loadObj, parseObj
+from objStream import ObjStream
+from parallelImport import splitLines
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def baselineParse(text):
+    """The loader objParser replaced, kept as the reference."""
+    vertices = []
+    triangles = []
+    for line in text.split('\n'):
+        params = [p for p in line.strip().split(' ') if p]
+        if not params:
+            continue
+        if params[0] == 'v':
+            vertices += [float(p) for p in params[1:4]]
+        elif params[0] == 'f':
+            triangles += [int(p) - 1 for p in params[1:4]]
+    return np.array(vertices, dtype=np.float32), np.array(triangles, dtype=np.uint32)
+
+
+def readLines(name):
+    with open(os.path.join(HERE, name)) as f:
+        return f.read().splitlines()
+
+
+def trailingComments(lines):
+    return '\n'.join(line + ' # note' for line in lines) + '\n'
+
+
+def indented(lines):
+    return '\n'.join(('  ' if i % 2 else '\t') + line for i, line in enumerate(lines)) + '\n'
+
+
+def crlf(lines):
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def commentLines(lines):
+    return '# exported\n' + '\n'.join(line + '\n# next' for line in lines) + '\n'
+
+
+def continued(lines):
+    """Break every third record after its first number."""
+    text = ''
+    for i, line in enumerate(lines):
+        if i % 3 == 0 and line.count(' ') >= 2:
+            key, first, rest = line.split(' ', 2)
+            line = f'{key} {first} \\\r\n{rest}'
+        text += line + '\r\n'
+    return text
+
+
+def everything(lines):
+    return '# exported\r\n' + ''.join(' \t' + line + ' # note\r\n' for line in lines)
+
+
+@pytest.mark.parametrize('name', ['teapot.obj', 'sphere.obj'])
+@pytest.mark.parametrize('reformat', [trailingComments, indented, crlf, commentLines, everything])
+def test_matches_baseline(name, reformat):
+    text = reformat(readLines(name))
+    expected = baselineParse(text)
+    for actual, wanted in zip(parseObj(text), expected):
+        assert actual.dtype == wanted.dtype
+        np.testing.assert_array_equal(actual, wanted)
+
+
+def test_continued_lines():
+    joined = 'v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n'
+    text = 'v 0 \\\n0 0\nv 1 0 0\nv 0 1 0\nf 1 \\\r\n2 3\n'
+    for actual, wanted in zip(parseObj(text), parseObj(joined)):
+        np.testing.assert_array_equal(actual, wanted)
+
+
+def test_pieces_match_whole_file(tmp_path):
+    text = continued(readLines('teapot.obj'))
+    path = tmp_path / 'teapot.obj'
+    path.write_bytes(text.encode())
+    expected = loadObj(str(path))
+    for actual, wanted in zip(expected, baselineParse(crlf(readLines('teapot.obj')))):
+        np.testing.assert_array_equal(actual, wanted)
+
+    # Small chunks cut the file in many places, none of them inside a continued record
+    for actual, wanted in zip(ObjStream(str(path), chunkSize=256).read(), expected):
+        np.testing.assert_array_equal(actual, wanted)
+    data = path.read_bytes()
+    for start, end in splitLines(str(path), pieceSize=256):
+        assert data[end - 2:end] != b'\\\n' and data[end - 3:end] != b'\\\r\n'
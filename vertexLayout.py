@@ -0,0 +1,149 @@
+"""Compact interleaved vertex buffers: quantized positions, encoded normals, 16-bit indices"""
+
+import numpy as np
+
+# Normal encodings: None keeps three floats
+NORMAL_OCTAHEDRAL = 'octahedral'
+NORMAL_PACKED = 'packed'
+
+# Largest vertex count that GL_UNSIGNED_SHORT indices can address
+MAX_SHORT_VERTICES = 1 << 16
+
+# Bytes per vertex of the plain layout the savings are measured against:
+# separate float32 position and normal arrays
+FLOAT_VERTEX_BYTES = 4 * 3 + 4 * 3
+
+
+def quantizePositions(positions):
+    """Map (N, 3) positions to normalized int16 within their bounding box.
+
+    Returns (quantized (N, 3) int16, scale, offset) where
+    position ~= quantized / 32767 * scale + offset.
+    """
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.zeros((0, 3), np.int16), np.ones(3, np.float32), np.zeros(3, np.float32)
+    low = positions.min(axis=0)
+    high = positions.max(axis=0)
+    offset = (low + high) / 2
+    scale = np.maximum((high - low) / 2, 1e-30)
+    quantized = np.round((positions - offset) / scale * 32767)
+    return (np.clip(quantized, -32767, 32767).astype(np.int16),
+            scale.astype(np.float32), offset.astype(np.float32))
+
+
+def octahedralEncode(normals):
+    """Encode (N, 3) unit normals as normalized int16 pairs on the octahedron.
+
+    The vertex shader decodes them with octDecode(). Zero normals encode
+    to +z.
+    """
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    lengths = np.abs(normals).sum(axis=1)
+    zero = lengths == 0
+    normals = normals / np.where(zero, 1.0, lengths)[:, None]
+    normals[zero] = (0, 0, 1)
+    encoded = normals[:, :2].copy()
+    # The lower hemisphere is folded over the diagonals onto the corners
+    lower = normals[:, 2] < 0
+    signs = np.where(encoded[lower] >= 0, 1.0, -1.0)
+    encoded[lower] = (1 - np.abs(encoded[lower][:, ::-1])) * signs
+    return np.round(np.clip(encoded, -1, 1) * 32767).astype(np.int16)
+
+
+def packNormals(normals):
+    """Pack (N, 3) unit normals as signed 10:10:10:2 integers, read as GL_INT_2_10_10_10_REV."""
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    components = np.round(np.clip(normals, -1, 1) * 511).astype(np.int64) & 0x3FF
+    return (components[:, 0] | components[:, 1] << 10 | components[:, 2] << 20).astype(np.uint32)
+
+
+class VertexLayout:
+    """One mesh's interleaved vertex buffer and index buffer, ready for upload.
+
+    `attributes` lists (name, components, type, normalized, byte offset)
+    for every interleaved attribute, with type one of 'float', 'short' or
+    'int_2_10_10_10_rev'. Positions are read back as
+    `aVertexPosition * positionScale + positionOffset`, which is the
+    identity for float positions.
+    """
+
+    def __init__(self, data, attributes, indices, positionScale, positionOffset):
+        self.data = data
+        self.attributes = attributes
+        self.indices = indices
+        self.positionScale = positionScale
+        self.positionOffset = positionOffset
+
+    @property
+    def stride(self):
+        return self.data.dtype.itemsize
+
+    @property
+    def vertexCount(self):
+        return len(self.data)
+
+    @property
+    def indexCount(self):
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.indices.nbytes
+
+    @property
+    def floatBytes(self):
+        """Size of the same mesh as float32 positions and normals with uint32 indices."""
+        return self.vertexCount * FLOAT_VERTEX_BYTES + self.indexCount * 4
+
+    def report(self):
+        saved = self.floatBytes - self.nbytes
+        return (f'{self.vertexCount} vertices x {self.stride} B, {self.indices.dtype.itemsize * 8}-bit indices: '
+                f'{self.nbytes} B, {saved} B ({100 * saved / max(self.floatBytes, 1):.0f}%) saved')
+
+
+def buildVertexLayout(vertices, normals, triangles, quantize=True, normalEncoding=NORMAL_OCTAHEDRAL):
+    """Interleave positions and normals into one record per vertex.
+
+    With `quantize` positions become normalized int16, padded to 8 bytes
+    so the record stays 4-byte aligned. `normalEncoding` is
+    NORMAL_OCTAHEDRAL (two int16), NORMAL_PACKED (one 10:10:10:2 word) or
+    None (three floats). Indices are uint16 when every vertex can be
+    addressed with them, uint32 otherwise.
+    """
+    positions = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+    count = len(positions)
+
+    if quantize:
+        positionData, positionScale, positionOffset = quantizePositions(positions)
+        fields = [('position', np.int16, (4,))]
+        position = ('aVertexPosition', 3, 'short', True, 0)
+    else:
+        positionData, positionScale, positionOffset = positions, np.ones(3, np.float32), np.zeros(3, np.float32)
+        fields = [('position', np.float32, (3,))]
+        position = ('aVertexPosition', 3, 'float', False, 0)
+
+    if normalEncoding == NORMAL_OCTAHEDRAL:
+        normalData = octahedralEncode(normals)
+        fields.append(('normal', np.int16, (2,)))
+        normal = ('aVertexNormal', 2, 'short', True)
+    elif normalEncoding == NORMAL_PACKED:
+        normalData = packNormals(normals)
+        fields.append(('normal', np.uint32))
+        normal = ('aVertexNormal', 4, 'int_2_10_10_10_rev', True)
+    elif normalEncoding is None:
+        normalData = normals
+        fields.append(('normal', np.float32, (3,)))
+        normal = ('aVertexNormal', 3, 'float', False)
+    else:
+        raise ValueError(f'unknown normal encoding {normalEncoding!r}')
+
+    data = np.zeros(count, dtype=np.dtype(fields))
+    data['position'][:, :3] = positionData
+    data['normal'] = normalData
+    attributes = [position, normal + (data.dtype.fields['normal'][1],)]
+
+    indexType = np.uint16 if count <= MAX_SHORT_VERTICES else np.uint32
+    indices = np.ascontiguousarray(triangles, dtype=indexType).reshape(-1)
+    return VertexLayout(data, attributes, indices, positionScale, positionOffset)